@@ -0,0 +1,132 @@
+import argparse
+import functools
+import json
+import os
+import shutil
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import cache
+import helper
+import stream
+import synthetic
+import topk
+
+
+BENCH_DIR = "./.cache/bench/"
+BASELINE_PATH = "./bench_baseline.json"
+TOLERANCE = 0.2  # relative slowdown reported as a regression
+REPEAT = 5  # timed runs of every stage; their median is compared against the baseline
+MIN_TIME = 1.0  # seconds that the timed runs of a stage take at least
+MIN_SLOWDOWN = 0.005  # seconds; smaller slowdowns are timer noise rather than regressions
+
+
+def measure(func, *args, repeat=REPEAT, setup=None, **kwargs):
+    """return the result of func, its median and best wall time in seconds, and its peak traced memory in MB.
+
+    func runs repeat times, and fast stages keep running until they have taken MIN_TIME. the timed runs
+    are not traced, since tracemalloc slows python-heavy code down; the peak memory is taken from one
+    more, traced run. setup is called before every run, e.g. to remove a cache."""
+    times = []
+    while len(times) < repeat or sum(times) < MIN_TIME:
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    func(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {"seconds": round(float(np.median(times)), 4), "min_seconds": round(min(times), 4), "peak_mb": round(peak / 2 ** 20, 2)}
+
+
+def get_dataset(rows, seed=0) -> str:
+    """return a synthetic archive of rows failures, generating it on first use."""
+    path = os.path.join(BENCH_DIR, f"synthetic-{rows}-{seed}.zip")
+    if not os.path.exists(path):
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        synthetic.generate(path + ".tmp", rows, seed=seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def get_tables(counts, freq):
+    """the work of Tables 3-5: rank failure types and collect the affected apps."""
+    return [topk.get_top_k(counts, k, cls=cls, freq=freq) for cls, k in [(None, 10), ("fn", 5), ("fp", 5)]]
+
+
+def run(rows, seed=0, repeat=REPEAT) -> dict:
+    """time and memory-profile every pipeline stage on a synthetic dataset of rows failures."""
+    path = get_dataset(rows, seed)
+    cache_dir = os.path.join(BENCH_DIR, f"cache-{rows}-{seed}")
+    clear_cache = functools.partial(shutil.rmtree, cache_dir, ignore_errors=True)
+    columns = ["type", "app_id", "device_brand", "device_model", "android_version"]
+    report = {}
+
+    _, report["ingest_build_cache"] = measure(cache.load_data, path, columns=columns, cache_dir=cache_dir, repeat=repeat, setup=clear_cache)
+    df, report["ingest_load_cache"] = measure(cache.load_data, path, columns=columns, cache_dir=cache_dir, repeat=repeat)
+    _, report["ingest_stream"] = measure(stream.aggregate, path, repeat=repeat)
+    _, report["get_freq_list"] = measure(helper.get_freq_list, df, repeat=repeat)
+    counts, report["count_table"] = measure(helper.get_count_table, df, by=stream.COUNT_KEYS, repeat=repeat)
+    freq = helper.get_freq_list_from_counts(counts)
+    major_version = np.floor(counts["android_version"])
+    for name, by in [("app_id", "app_id"), ("android_version", major_version), ("device_brand", "device_brand")]:
+        _, report[f"precision_recall_{name}"] = measure(helper.get_precision_recall_from_counts, counts, by=by, freq=freq, repeat=repeat)
+    _, report["top_k_tables"] = measure(get_tables, counts, freq, repeat=repeat)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    return report
+
+
+def compare(results, baseline, tolerance=TOLERANCE) -> list:
+    """return the (rows, stage, baseline seconds, seconds) of every stage slower than its baseline by more than tolerance
+    and MIN_SLOWDOWN."""
+    regressions = []
+    for rows, stages in results.items():
+        for stage, result in stages.items():
+            reference = baseline.get(rows, {}).get(stage)
+            if reference and result["seconds"] > max(reference["seconds"] * (1 + tolerance), reference["seconds"] + MIN_SLOWDOWN):
+                regressions.append((rows, stage, reference["seconds"], result["seconds"]))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic failure datasets.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1e6], help="dataset sizes in rows, e.g. 1e6 1e7 1e8")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="stored results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="relative slowdown reported as a regression")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timed runs of every stage (fast stages run for at least MIN_TIME); their median is compared")
+    parser.add_argument("--out", default=None, help="write the results as json")
+    args = parser.parse_args()
+
+    results = {}
+    for rows in [int(size) for size in args.sizes]:
+        print(f"Benchmarking {rows} rows...")
+        results[str(rows)] = run(rows, seed=args.seed, repeat=args.repeat)
+        print(pd.DataFrame(results[str(rows)]).T.to_string())
+        print()
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), tolerance=args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:")
+            print(pd.DataFrame(regressions, columns=["rows", "stage", "baseline_seconds", "seconds"]).to_string(index=False))
+            raise SystemExit(1)
+        print("No regressions against the baseline.")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved the baseline to {args.baseline}")
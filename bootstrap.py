@@ -0,0 +1,108 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import helper
+
+
+BATCH = 64  # replicates resampled at once
+
+
+def _fold(phys, virt, t, g, labels, n_types, n_groups) -> np.ndarray:
+    """return the tp_phys, tp_virt, fp and fn counts of every group in a batch of resampled count tables.
+
+    phys and virt have one row per replicate and one column per count table cell. labels holds the
+    class code of every cell; if it is None, failure types are re-labelled from each replicate's counts."""
+    n = phys.shape[0]
+    rows = np.arange(n)[:, None]
+    if labels is None:
+        cell = (rows * n_types + t).ravel()
+        type_phys = np.bincount(cell, weights=phys.ravel(), minlength=n * n_types).reshape(n, n_types)
+        type_virt = np.bincount(cell, weights=virt.ravel(), minlength=n * n_types).reshape(n, n_types)
+        labels = helper.get_class_codes(type_phys > 0, type_virt > 0)[rows, t]
+    else:
+        labels = np.broadcast_to(labels, phys.shape)
+
+    grouped = g >= 0
+    cell = (rows * n_groups + g)[:, grouped].ravel()
+    phys, virt, labels = phys[:, grouped].ravel(), virt[:, grouped].ravel(), labels[:, grouped].ravel()
+    out = np.empty((n, 4, n_groups))
+    for i, (mask, weights) in enumerate([(labels == 0, phys), (labels == 0, virt),
+                                         (labels == 1, phys + virt), (labels == 2, phys + virt)]):
+        out[:, i] = np.bincount(cell[mask], weights=weights[mask], minlength=n * n_groups).reshape(n, n_groups)
+    return out
+
+
+def _resample(p, v, t, g, labels, n_types, n_groups, n, seed, method) -> np.ndarray:
+    """return the folded counts of n replicates of a count table."""
+    rng = np.random.default_rng(seed)
+    total = p.sum() + v.sum()
+    pvals = np.concatenate([p, v]) / total
+    out = np.empty((n, 4, n_groups))
+    for start in range(0, n, BATCH):
+        size = min(BATCH, n - start)
+        if method == "poisson":
+            # every failure is drawn Poisson(1) times, so a cell of c failures is drawn Poisson(c) times
+            phys, virt = rng.poisson(p, (size, len(p))), rng.poisson(v, (size, len(v)))
+        else:
+            draws = rng.multinomial(total, pvals, size=size)
+            phys, virt = draws[:, :len(p)], draws[:, len(p):]
+        out[start:start + size] = _fold(phys, virt, t, g, labels, n_types, n_groups)
+    return out
+
+
+def get_confidence_intervals(counts, by=None, n=1000, confidence=0.95, method="poisson", reclassify=False,
+                             n_jobs=1, seed=0, column="type") -> pd.DataFrame:
+    """return precision and recall (in %) with bootstrap confidence intervals for each group of a count table.
+
+    failures are resampled as whole count tables (method="poisson" or "multinomial"), n replicates in
+    batches of BATCH, spread over n_jobs processes. failure types keep the class of the observed data
+    unless reclassify is set; re-labelling every replicate biases both metrics down, since a rare true
+    positive type can lose its phys or virt failures in a replicate but a false one never gains them."""
+    if method not in ("poisson", "multinomial"):
+        raise ValueError(f"unknown method: {method}")
+    keys = helper.as_keys(counts, by)
+    metrics = helper.get_precision_recall_from_counts(counts, by=by, column=column)
+
+    # resample at the granularity of the groups: a sum of poisson or multinomial cells is one such cell
+    names = [f"key_{i}" for i in range(len(keys))]
+    cells = pd.DataFrame({name: k.to_numpy() for name, k in zip(names, keys)})
+    cells[column] = counts[column].to_numpy()
+    cells[["count_phys", "count_virt"]] = counts[["count_phys", "count_virt"]].to_numpy()
+    cells = cells[cells[column].notna()]
+    cells = cells.groupby(names + [column], observed=True, sort=False, dropna=False)[["count_phys", "count_virt"]]
+    cells = cells.sum().reset_index()
+
+    t = pd.factorize(cells[column])[0]
+    g = np.zeros(len(t), dtype=np.int64)
+    if names:
+        grouping = cells.groupby(names, observed=True)
+        g = grouping.ngroup().to_numpy()
+        g = np.where(g >= 0, metrics.index.get_indexer(grouping.size().index)[g], -1)
+    p = cells["count_phys"].to_numpy(dtype=np.int64)
+    v = cells["count_virt"].to_numpy(dtype=np.int64)
+    labels = None
+    if not reclassify:
+        freq = helper.get_freq_list_from_counts(counts, column=column)
+        labels = cells[column].map(helper.get_class_labels(freq, column)).cat.codes.to_numpy()
+        labels = np.where(labels < 0, len(helper.CLASSES), labels)
+    args = (p, v, t, g, labels, t.max() + 1, len(metrics))
+
+    seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+    sizes = [n // n_jobs + (i < n % n_jobs) for i in range(n_jobs)]
+    if n_jobs == 1:
+        folded = _resample(*args, sizes[0], seeds[0], method)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(_resample, *args, size, s, method) for size, s in zip(sizes, seeds)]
+            folded = np.concatenate([f.result() for f in futures])
+
+    tp_phys, tp_virt, fp, fn = folded[:, 0], folded[:, 1], folded[:, 2], folded[:, 3]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = tp_virt / (tp_virt + fp) * 100
+        recall = tp_phys / (tp_phys + fn) * 100
+    q = [(1 - confidence) / 2, 1 - (1 - confidence) / 2]
+    metrics["precision_low"], metrics["precision_high"] = np.nanquantile(precision, q, axis=0)
+    metrics["recall_low"], metrics["recall_high"] = np.nanquantile(recall, q, axis=0)
+    return metrics
@@ -0,0 +1,134 @@
+import hashlib
+import os
+from zipfile import ZipFile
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_DIR = "./.cache/"
+CACHE_VERSION = 1
+
+# column types of the cached failure data. string columns not listed here are dictionary-encoded as well.
+SCHEMA = {
+    "type": "category",
+    "error": "category",
+    "device_brand": "category",
+    "device_model": "category",
+    "android_version": "float32",
+    "app_id": "int8",
+    "failure_time": "datetime",
+}
+
+
+def hash_file(path, chunk_size=1 << 20) -> str:
+    """return the sha256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_cache_path(path="data.zip", cache_dir=CACHE_DIR) -> str:
+    """return the cache file of an archive. the name changes whenever the archive content does."""
+    return os.path.join(cache_dir, f"data-v{CACHE_VERSION}-{hash_file(path)[:16]}.npz")
+
+
+def get_csv_member(zf) -> str:
+    """return the name of the first csv file in an archive."""
+    for name in zf.namelist():
+        if name.endswith(".csv"):
+            return name
+    raise FileNotFoundError(f"no csv file found in {zf.filename}")
+
+
+# column types passed to read_csv. type is parsed as numbers first, so that its categories keep their original values
+CSV_DTYPES = {k: v for k, v in SCHEMA.items() if k != "type" and v != "datetime"}
+
+
+def apply_schema(df) -> pd.DataFrame:
+    """finish the column types of SCHEMA on failure data read with CSV_DTYPES."""
+    if "type" in df.columns:
+        df["type"] = df["type"].astype("category")
+    if "failure_time" in df.columns:
+        df["failure_time"] = pd.to_datetime(df["failure_time"], unit="s")
+    for column in df.columns:
+        if pd.api.types.is_string_dtype(df[column].dtype):
+            df[column] = df[column].astype("category")
+    return df
+
+
+def read_zip(path="data.zip") -> pd.DataFrame:
+    """read the failure data straight from the archive, with the column types of SCHEMA."""
+    with ZipFile(path, "r") as zf:
+        with zf.open(get_csv_member(zf)) as f:
+            df = pd.read_csv(f, dtype=CSV_DTYPES)
+    return apply_schema(df)
+
+
+def _encode_strings(values) -> dict:
+    """pack a list of strings into one character buffer and their offsets."""
+    values = [str(v) for v in values]
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    return {"data": np.frombuffer("".join(values).encode("utf-32-le"), dtype=np.uint32), "offsets": offsets}
+
+
+def _decode_strings(data, offsets) -> list:
+    text = data.tobytes().decode("utf-32-le")
+    return [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+def save_cache(df, cache_path):
+    """write a typed frame to a compressed columnar file, one array (or codes + dictionary) per column."""
+    arrays = {"__columns__": np.array(df.columns, dtype=str)}
+    for column in df.columns:
+        s = df[column]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            categories = s.cat.categories
+            arrays[f"{column}.codes"] = s.cat.codes.to_numpy()
+            if pd.api.types.is_string_dtype(categories.dtype):
+                encoded = _encode_strings(categories)
+                arrays[f"{column}.data"] = encoded["data"]
+                arrays[f"{column}.offsets"] = encoded["offsets"]
+            else:
+                arrays[f"{column}.categories"] = categories.to_numpy()
+        else:
+            arrays[f"{column}.values"] = s.to_numpy()
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = cache_path + ".tmp.npz"
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, cache_path)
+
+
+def load_cache(cache_path, columns=None) -> pd.DataFrame:
+    """read a cached frame. only the arrays of the requested columns are decompressed."""
+    with np.load(cache_path) as npz:
+        available = [str(c) for c in npz["__columns__"]]
+        if columns is None:
+            columns = available
+        missing = [c for c in columns if c not in available]
+        if missing:
+            raise KeyError(f"columns not found in cache: {missing}")
+        data = {}
+        for column in columns:
+            if f"{column}.values" in npz.files:
+                data[column] = npz[f"{column}.values"]
+                continue
+            if f"{column}.categories" in npz.files:
+                categories = npz[f"{column}.categories"]
+            else:
+                categories = _decode_strings(npz[f"{column}.data"], npz[f"{column}.offsets"])
+            data[column] = pd.Categorical.from_codes(npz[f"{column}.codes"], categories=categories)
+    return pd.DataFrame(data, columns=columns)
+
+
+def load_data(path="data.zip", columns=None, cache_dir=CACHE_DIR) -> pd.DataFrame:
+    """load the failure data, converting the archive to the columnar cache on first use.
+
+    columns restricts the load to the listed fields."""
+    cache_path = get_cache_path(path, cache_dir)
+    if not os.path.exists(cache_path):
+        save_cache(read_zip(path), cache_path)
+    return load_cache(cache_path, columns=columns)
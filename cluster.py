@@ -0,0 +1,204 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import stack
+
+
+NUM_PERM = 64  # minhash permutations
+BANDS = 16  # lsh bands of NUM_PERM // BANDS rows each
+THRESHOLD = 0.8  # estimated jaccard similarity for two stacks to share a failure type
+CLUSTERS_PATH = "./.cache/clusters.pkl"
+
+
+def _mix(x) -> np.ndarray:
+    """splitmix64 finalizer: spread the bits of uint64 values, wrapping on overflow."""
+    x = np.asarray(x, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _combine(h, x) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        return _mix(h * np.uint64(0x9E3779B97F4A7C15) + x)
+
+
+def _hash_strings(values) -> np.ndarray:
+    """stable uint64 hashes of strings, identical across runs and batches."""
+    return pd.util.hash_array(np.asarray([str(v) for v in values], dtype=object))
+
+
+def get_shingles(index, depth=None) -> tuple:
+    """return the shingles of every stack of a StackIndex and the stack each one belongs to.
+
+    stacks are normalized to their (file, method) frames, without line numbers, and cut to the top depth
+    frames. the shingles are the frames and every pair of adjacent frames, hashed to uint64."""
+    frames = _combine(_hash_strings(index.files)[index.frame_file], _hash_strings(index.methods)[index.frame_method])
+    position = np.arange(len(index.frame_stack)) - index.stack_offsets[index.frame_stack]
+    keep = np.ones(len(frames), dtype=bool) if depth is None else position < depth
+    # adjacent frames of the same stack
+    pairs = keep[1:] & (position[1:] > 0)
+    shingles = np.concatenate([frames[keep], _combine(frames[:-1][pairs], frames[1:][pairs] ^ np.uint64(1))])
+    owners = np.concatenate([index.frame_stack[keep], index.frame_stack[1:][pairs]])
+    order = np.argsort(owners, kind="stable")
+    return shingles[order], owners[order]
+
+
+def get_signatures(shingles, owners, n_stacks, a, b, batch=16) -> np.ndarray:
+    """return the minhash signature of every stack, one uint32 column per (a, b) hash function.
+
+    h(x) = (a * x + b) >> 32 over uint64 is a multiply-shift hash; stacks without shingles get all ones."""
+    signatures = np.full((n_stacks, len(a)), np.iinfo(np.uint32).max, dtype=np.uint32)
+    if len(shingles) == 0:
+        return signatures
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+    for i in range(0, len(a), batch):
+        # one row per hash function, so that reduceat runs along contiguous memory
+        with np.errstate(over="ignore"):
+            h = ((a[i:i + batch, None] * shingles[None, :] + b[i:i + batch, None]) >> np.uint64(32)).astype(np.uint32)
+        signatures[owners[starts], i:i + batch] = np.minimum.reduceat(h, starts, axis=1).T
+    return signatures
+
+
+def get_band_keys(signatures, errors, bands) -> np.ndarray:
+    """return one uint64 bucket key per (stack, band). the error is part of every key, so that
+    failures with different errors never share a type."""
+    rows = signatures.shape[1] // bands
+    keys = np.empty((len(signatures), bands), dtype=np.uint64)
+    for band in range(bands):
+        key = errors
+        for column in range(band * rows, (band + 1) * rows):
+            key = _combine(key, signatures[:, column].astype(np.uint64))
+        keys[:, band] = key
+    return keys
+
+
+def _components(n, u, v) -> np.ndarray:
+    """return the smallest member of the connected component of every node of an edge list."""
+    parent = np.arange(n)
+    while True:
+        pu, pv = parent[u], parent[v]
+        low = np.minimum(pu, pv)
+        new = parent.copy()
+        np.minimum.at(new, pu, low)
+        np.minimum.at(new, pv, low)
+        while (new[new] != new).any():
+            new = new[new]
+        if (new == parent).all():
+            return parent
+        parent = new
+
+
+class StackClusters:
+    """minhash/lsh clusters of failures by error and normalized stack, numbered as failure types from 1.
+
+    every cluster keeps the signature and band keys of one representative stack. a new stack joins the cluster
+    whose representative shares an lsh band with it and is the most similar, if the estimated jaccard
+    similarity reaches threshold; the remaining stacks are linked among themselves the same way and
+    open new clusters, numbered by decreasing failure count. no pair of stacks is ever compared outside
+    of an lsh bucket, so the work is near-linear in the number of distinct stacks."""
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, threshold=THRESHOLD, depth=None, seed=0):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) is not a multiple of bands ({bands})")
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.threshold = threshold
+        self.depth = depth
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)  # one representative per cluster
+        self.buckets = [pd.Series(dtype=np.int64) for _ in range(bands)]  # band key -> cluster
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _similarity(self, signatures, clusters) -> np.ndarray:
+        return (signatures == self.signatures[clusters]).mean(axis=1)
+
+    def _match(self, signatures, keys) -> np.ndarray:
+        """return the existing cluster of every stack, or -1."""
+        best = np.full(len(signatures), -1)
+        best_similarity = np.zeros(len(signatures))
+        for band in range(self.bands):
+            clusters = self.buckets[band].reindex(keys[:, band]).to_numpy()
+            hit = np.flatnonzero(~np.isnan(clusters))
+            clusters = clusters[hit].astype(np.int64)
+            similarity = self._similarity(signatures[hit], clusters)
+            better = (similarity >= self.threshold) & (similarity > best_similarity[hit])
+            best[hit[better]], best_similarity[hit[better]] = clusters[better], similarity[better]
+        return best
+
+    def _link(self, signatures, keys) -> np.ndarray:
+        """cluster stacks among themselves: return the smallest member of each stack's cluster."""
+        u, v = [], []
+        for band in range(self.bands):
+            _, first, inverse = np.unique(keys[:, band], return_index=True, return_inverse=True)
+            rep = first[inverse]
+            candidates = np.flatnonzero(rep != np.arange(len(rep)))
+            similar = (signatures[candidates] == signatures[rep[candidates]]).mean(axis=1) >= self.threshold
+            u.append(candidates[similar])
+            v.append(rep[candidates[similar]])
+        return _components(len(signatures), np.concatenate(u), np.concatenate(v))
+
+    def assign(self, errors, stack_frames) -> np.ndarray:
+        """return the failure type of every (error, stack_frame) pair, opening new types as needed."""
+        index = stack.parse_stack_frames(stack_frames)
+        n_stacks = len(index.stack_offsets) - 1
+        signatures = get_signatures(*get_shingles(index, self.depth), n_stacks, self.a, self.b)
+
+        # one item per distinct (error, stack)
+        error_codes, error_values = pd.factorize(pd.Series(errors), use_na_sentinel=False)
+        items, item_ids = np.unique(error_codes.astype(np.int64) * n_stacks + index.stack_ids, return_inverse=True)
+        item_errors, item_stacks = np.divmod(items, n_stacks)
+        signatures = signatures[item_stacks]
+        keys = get_band_keys(signatures, _hash_strings(error_values)[item_errors], self.bands)
+        weights = np.bincount(item_ids, minlength=len(items))
+
+        clusters = self._match(signatures, keys)
+        new = np.flatnonzero(clusters < 0)
+        if len(new):
+            roots = self._link(signatures[new], keys[new])
+            roots, local = np.unique(roots, return_inverse=True)
+            # new clusters are numbered by decreasing failure count
+            sizes = np.bincount(local, weights=weights[new])
+            rank = np.empty(len(roots), dtype=np.int64)
+            rank[np.lexsort((roots, -sizes))] = np.arange(len(roots))
+            clusters[new] = len(self) + rank[local]
+            order = np.argsort(rank)
+            self._add(signatures[new][roots[order]], keys[new][roots[order]])
+        return clusters[item_ids] + 1
+
+    def _add(self, signatures, keys):
+        ids = np.arange(len(self), len(self) + len(signatures))
+        self.signatures = np.concatenate([self.signatures, signatures])
+        for band in range(self.bands):
+            added = pd.Series(ids, index=keys[:, band])
+            added = added[~added.index.duplicated() & ~added.index.isin(self.buckets[band].index)]
+            self.buckets[band] = pd.concat([self.buckets[band], added]) if len(self.buckets[band]) else added
+
+
+def assign_types(df, clusters=None, column="type") -> pd.Series:
+    """return a failure type column for df, clustered from its error and stack_frame columns.
+
+    pass the StackClusters of earlier batches (see load_clusters) to assign new failures to their existing
+    types; they are updated in place with the new types. without them, df is clustered on its own."""
+    clusters = StackClusters() if clusters is None else clusters
+    return pd.Series(clusters.assign(df["error"].to_numpy(), df["stack_frame"]), index=df.index, name=column)
+
+
+def load_clusters(path=CLUSTERS_PATH) -> StackClusters:
+    """load persisted clusters, or start empty ones."""
+    try:
+        return pd.read_pickle(path)
+    except FileNotFoundError:
+        return StackClusters()
+
+
+def save_clusters(clusters, path=CLUSTERS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pd.to_pickle(clusters, path + ".tmp")
+    os.replace(path + ".tmp", path)
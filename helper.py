@@ -1,41 +1,263 @@
+import numpy as np
 import pandas as pd
 import ast
 
+import cache
 
-def filter_exclusive(df, brand1="emu", brand2="phys", column="type"):
+
+def filter_exclusive(df, brand1="emu", brand2="phys", column="type", matrix=None):
     """get brand1 exclusive dataframe (against brand2)"""
-    freq_list = get_freq_list(df, brand1=brand1, brand2=brand2, column=column)
-    exclusive_tokens = freq_list.loc[(freq_list[f"ri_{brand1}"] != 0) & (freq_list[f"ri_{brand2}"] == 0)][column].to_list()
-    return df.loc[df[column].isin(exclusive_tokens)]
+    if matrix is None:
+        matrix = get_count_matrix(df, column=column, brands=_has_brands(brand1, brand2))
+    exclusive = (get_group_counts(matrix, brand1) != 0) & (get_group_counts(matrix, brand2) == 0)
+    return df.loc[df[column].isin(matrix.index[exclusive.to_numpy()])]
 
 
 def count(df, column: str) -> pd.DataFrame:
-    return df.groupby([column])[column].count().sort_values(ascending=False).reset_index(name='count')
+    return df.groupby([column], observed=True)[column].count().sort_values(ascending=False).reset_index(name='count')
+
+
+def _has_brands(*groups) -> bool:
+    """whether any of the device groups is a brand rather than phys or virt."""
+    return any(group not in ("phys", "virt") for group in groups)
+
+
+def get_count_matrix_from_counts(counts, column="type") -> pd.DataFrame:
+    """return a sparse failure type x device group count matrix from a count table.
+
+    there is one column per brand if the table has a device_brand key, plus phys and virt."""
+    groups = counts.groupby(column, observed=True)[["count_phys", "count_virt"]].sum()
+    if "device_brand" in counts.columns:
+        total = counts["count_phys"] + counts["count_virt"]
+        matrix = total.groupby([counts[column], counts["device_brand"]], observed=True).sum().unstack(fill_value=0)
+        matrix = matrix.reindex(groups.index, fill_value=0)  # types only seen on devices without a brand
+        matrix.columns = list(matrix.columns)
+    else:
+        matrix = pd.DataFrame(index=groups.index)
+    matrix["phys"] = groups["count_phys"]
+    matrix["virt"] = groups["count_virt"]
+    matrix.columns.name = "group"
+    return matrix.sort_index().astype(pd.SparseDtype("int64", 0))
 
 
-def get_brand_list(df, brand: str, column: str) -> pd.DataFrame:
+def get_count_matrix(df, column="type", brands=True) -> pd.DataFrame:
+    """return a sparse failure type x device group count matrix, built in one pass over df.
+
+    brand columns are only built with brands=True and a device_brand column; phys and virt are always there."""
     if column not in df.columns:
         print("error! failure type identifier not found. Please select a valid column.")
-    if brand == "phys":
-        df_brand = df[df.device_model != 'virt']
-    elif brand == "virt":
-        df_brand = df[df.device_model == 'virt']
-    else:
-        df_brand = df[df.device_brand == brand]
+    by = "device_brand" if brands and "device_brand" in df.columns else None
+    return get_count_matrix_from_counts(get_count_table(df, by=by, column=column), column=column)
 
-    return count(df_brand, column)
 
+def get_group_counts(matrix, group: str) -> pd.Series:
+    """return the dense failure counts of a device group (a brand, phys or virt). unknown groups count zero."""
+    if group not in matrix.columns:
+        return pd.Series(0, index=matrix.index, name=group)
+    return matrix[group].sparse.to_dense()
 
-def get_freq_list(df, brand1="phys", brand2="virt", column="type") -> pd.DataFrame:
-    """return a dataframe that shows the total number of failure occurrences."""
 
-    brand1_list = get_brand_list(df, brand1, column)
-    brand2_list = get_brand_list(df, brand2, column)
+def get_brand_list(df, brand: str, column: str, matrix=None) -> pd.DataFrame:
+    if matrix is None:
+        matrix = get_count_matrix(df, column=column, brands=_has_brands(brand))
+    brand_counts = get_group_counts(matrix, brand)
+    brand_counts = brand_counts[brand_counts != 0].rename("count")
+    return brand_counts.sort_values(ascending=False).rename_axis(column).reset_index()
+
 
-    freq_list = brand1_list.merge(brand2_list, how='outer', on=column)
-    freq_list = freq_list.fillna(0)  # fill na to avoid exceptions
-    freq_list["count"] = freq_list["count_x"] + freq_list["count_y"]
-    freq_list = freq_list.rename(columns={'count_x': 'count_' + brand1, 'count_y': 'count_' + brand2})
+def get_freq_list(df, brand1="phys", brand2="virt", column="type", matrix=None) -> pd.DataFrame:
+    """return a dataframe that shows the total number of failure occurrences."""
+    if matrix is None:
+        matrix = get_count_matrix(df, column=column, brands=_has_brands(brand1, brand2))
+
+    freq_list = pd.DataFrame({
+        'count_' + brand1: get_group_counts(matrix, brand1),
+        'count_' + brand2: get_group_counts(matrix, brand2),
+    })
+    freq_list = freq_list[(freq_list != 0).any(axis=1)].rename_axis(column).reset_index()
+    freq_list["count"] = freq_list['count_' + brand1] + freq_list['count_' + brand2]
     order = [column, 'count', 'count_' + brand1, 'count_' + brand2]
     freq_list = freq_list[order]
     return freq_list
+
+
+def get_exclusive_matrix(matrix) -> pd.DataFrame:
+    """return, for every pair of device groups (a, b), the number of failure types seen on a but never on b."""
+    present = (matrix != 0).to_numpy(dtype=np.int64)
+    exclusive = present.T @ (1 - present)
+    return pd.DataFrame(exclusive, index=matrix.columns, columns=matrix.columns)
+
+
+CLASSES = ["tp", "fp", "fn"]
+
+
+def as_keys(df, by) -> list:
+    """resolve grouping keys: column names are looked up in df, anything else is used as-is."""
+    if by is None:
+        return []
+    if isinstance(by, (str, pd.Series)):
+        by = [by]
+    return [df[k] if isinstance(k, str) else k for k in by]
+
+
+def get_count_table(df, by=None, column="type") -> pd.DataFrame:
+    """return the phys/virt failure counts of every (by..., column) combination, in one pass.
+
+    every key is factorized and folded into one group id per row, so that the counts are a bincount."""
+    keys = as_keys(df, by) + [df[column]]
+    group = np.zeros(len(df), dtype=np.int64)
+    for key in keys:
+        codes, uniques = pd.factorize(key, use_na_sentinel=False)
+        group, groups = pd.factorize(group * len(uniques) + codes)
+    # the first row of every group gives its key values, in their original types
+    first = np.zeros(len(groups), dtype=np.int64)
+    first[group[::-1]] = np.arange(len(df) - 1, -1, -1)
+    virt = (df["device_model"] == "virt").to_numpy(dtype=bool)
+    counts = np.bincount(group * 2 + virt, minlength=2 * len(groups)).reshape(len(groups), 2)
+    table = pd.DataFrame({key.name: key.iloc[first].reset_index(drop=True) for key in keys})
+    table["count_phys"], table["count_virt"] = counts[:, 0], counts[:, 1]
+    return table
+
+
+def cast_count_keys(counts) -> pd.DataFrame:
+    """give the key columns of a count table the column types of cache.SCHEMA.
+
+    tables of the cached data, of streamed chunks and of older caches then share their keys; a float64
+    android version 5.1 and a float32 one would otherwise be counted apart."""
+    dtypes = {k: v for k, v in cache.SCHEMA.items() if k in counts.columns and v != "datetime"}
+    return counts.astype(dtypes)
+
+
+def merge_count_tables(tables) -> pd.DataFrame:
+    """sum count tables that share the same key columns into one."""
+    tables = list(tables)
+    keys = [c for c in tables[0].columns if c not in ("count_phys", "count_virt")]
+    merged = cast_count_keys(pd.concat(tables, ignore_index=True))
+    return merged.groupby(keys, observed=True, sort=False, dropna=False)[["count_phys", "count_virt"]].sum().reset_index()
+
+
+def get_freq_list_from_counts(counts, column="type") -> pd.DataFrame:
+    """same as get_freq_list, but folded from a count table instead of the raw failures."""
+    freq_list = counts.groupby(column, observed=True)[["count_phys", "count_virt"]].sum().reset_index()
+    freq_list["count"] = freq_list["count_phys"] + freq_list["count_virt"]
+    return freq_list[[column, 'count', 'count_phys', 'count_virt']]
+
+
+def get_class_codes(phys, virt) -> np.ndarray:
+    """return the class code (an index into CLASSES) of boolean phys/virt occurrence arrays.
+
+    types that occur on neither get len(CLASSES)."""
+    return np.select([phys & virt, virt, phys], range(len(CLASSES)), default=len(CLASSES)).astype(np.int8)
+
+
+def get_class_labels(freq, column="type") -> pd.Series:
+    """map each failure type of a frequency list to its class (tp, fp or fn)."""
+    codes = get_class_codes((freq["count_phys"] != 0).to_numpy(), (freq["count_virt"] != 0).to_numpy())
+    labels = pd.Categorical.from_codes(np.where(codes < len(CLASSES), codes, -1), categories=CLASSES)
+    return pd.Series(labels, index=freq[column].to_numpy(), name="class")
+
+
+def label_failures(df, freq=None, column="type") -> pd.Series:
+    """label every failure row with the class of its type."""
+    if freq is None:
+        freq = get_freq_list(df, column=column)
+    return df[column].map(get_class_labels(freq, column))
+
+
+def get_class_counts(counts, labels, column="type") -> pd.DataFrame:
+    """split every row of a count table into tp_phys, tp_virt, fp and fn by the class of its type."""
+    cls = counts[column].map(labels)
+    total = counts["count_phys"] + counts["count_virt"]
+    return pd.DataFrame({
+        "tp_phys": counts["count_phys"].where(cls == "tp", 0),
+        "tp_virt": counts["count_virt"].where(cls == "tp", 0),
+        "fp": total.where(cls == "fp", 0),
+        "fn": total.where(cls == "fn", 0),
+    })
+
+
+def add_precision_recall(metrics) -> pd.DataFrame:
+    """add precision and recall (in %) to a frame of tp_phys, tp_virt, fp and fn counts."""
+    metrics["precision"] = metrics["tp_virt"] / (metrics["tp_virt"] + metrics["fp"]) * 100
+    metrics["recall"] = metrics["tp_phys"] / (metrics["tp_phys"] + metrics["fn"]) * 100
+    return metrics
+
+
+def get_precision_recall_from_counts(counts, by=None, freq=None, column="type") -> pd.DataFrame:
+    """return the tp/fp/fn counts, precision and recall (in %) of each group of a count table.
+
+    classes are global: they are derived from freq (or the whole count table), not from each group."""
+    if freq is None:
+        freq = get_freq_list_from_counts(counts, column=column)
+    parts = get_class_counts(counts, get_class_labels(freq, column), column=column)
+    keys = as_keys(counts, by)
+    if keys:
+        metrics = parts.groupby(keys, observed=True).sum()
+    else:
+        metrics = parts.sum().to_frame().T
+    return add_precision_recall(metrics)
+
+
+def get_precision_recall(df, by=None, freq=None, column="type") -> pd.DataFrame:
+    """return precision and recall (in %) of the virtualized devices for each group of df.
+
+    by can be a column name, a series aligned with df, or a list of them."""
+    keys = as_keys(df, by)
+    original = [getattr(k, "name", None) for k in keys]
+    # positional names, so that unnamed keys and keys named like column or like each other stay apart
+    names = [f"key_{i}" for i in range(len(keys))]
+    keys = [k.rename(name) if isinstance(k, pd.Series) else pd.Series(k, index=df.index, name=name) for k, name in zip(keys, names)]
+    counts = get_count_table(df, by=keys, column=column)
+    metrics = get_precision_recall_from_counts(counts, by=names, freq=freq, column=column)
+    if keys:
+        metrics.index.names = original
+    return metrics
+
+
+def get_freq_diff(counts, rounds=1, devices_phys=1, devices_virt=1, freq=None, classes=("tp",), column="type") -> pd.Series:
+    """return the frequency difference (in %) between virtualized and physical devices of each failure type.
+
+    frequencies are failures per device per test round: the counts of every app are divided by its test
+    rounds (rounds maps app_id to rounds, or is one number for all apps), summed per type and divided by
+    the device counts. the difference is relative to the mean of the two frequencies, so it lies in
+    [-200, 200], positive values mean virtualized devices fail more frequently, and scaling both
+    frequencies alike leaves it unchanged. only the types of the given classes (of freq, or of the whole
+    count table) are kept, common failures by default."""
+    if np.isscalar(rounds):
+        weights = np.full(len(counts), 1 / rounds)
+    else:
+        weights = 1 / pd.Series(counts["app_id"]).map(rounds).to_numpy(dtype=np.float64)
+    rates = pd.DataFrame({
+        column: counts[column].to_numpy(),
+        "phys": counts["count_phys"].to_numpy() * weights / devices_phys,
+        "virt": counts["count_virt"].to_numpy() * weights / devices_virt,
+    }).groupby(column, observed=True).sum()
+    if freq is None:
+        freq = get_freq_list_from_counts(counts, column=column)
+    keep = get_class_labels(freq, column).reindex(rates.index).isin(classes).to_numpy()
+    phys, virt = rates["phys"].to_numpy()[keep], rates["virt"].to_numpy()[keep]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diff = (virt - phys) / ((virt + phys) / 2) * 100
+    return pd.Series(diff, index=pd.Index(rates.index[keep], name=column), name="freq_diff")
+
+
+def get_ecdf(values) -> tuple:
+    """return the exact empirical CDF of values: their sorted distinct values and the fraction of values <= each."""
+    x = np.sort(np.asarray(values, dtype=np.float64))
+    x = x[~np.isnan(x)]
+    if len(x) == 0:
+        return x, np.empty(0)
+    ends = np.flatnonzero(np.r_[x[1:] != x[:-1], True])
+    return x[ends], (ends + 1) / len(x)
+
+
+def describe_freq_diff(values, quantiles=(0.05, 0.25, 0.75, 0.95)) -> pd.Series:
+    """return the max, mean, median, min and quantiles of frequency differences, all nan without any."""
+    x = np.asarray(values, dtype=np.float64)
+    x = x[~np.isnan(x)]
+    if len(x) == 0:
+        return pd.Series(np.nan, index=["max", "mean", "median", "min", *[f"q{round(p * 100):02d}" for p in quantiles]])
+    q = np.quantile(x, [0.5, *quantiles])
+    stats = {"max": x.max(), "mean": x.mean(), "median": q[0], "min": x.min()}
+    stats.update({f"q{round(p * 100):02d}": v for p, v in zip(quantiles, q[1:])})
+    return pd.Series(stats)
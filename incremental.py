@@ -0,0 +1,202 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import helper
+import stream
+
+
+STATE_PATH = "./.cache/state.pkl"
+ALL = "all"  # the dimension of the overall metrics
+
+
+def new_state(by=stream.COUNT_KEYS, column="type") -> dict:
+    """return an empty aggregate state keyed on by."""
+    by = list(by)
+    empty = pd.DataFrame(columns=["tp_phys", "tp_virt", "fp", "fn"], dtype="int64")
+    return {
+        "by": by,
+        "column": column,
+        "batches": 0,
+        "counts": _new_counts(by + [column]),
+        "freq": pd.DataFrame(columns=["count_phys", "count_virt"], dtype="int64"),
+        "metrics": {dim: empty.copy() for dim in by + [ALL]},
+        "transitions": pd.DataFrame(columns=["batch", column, "before", "after"]),
+    }
+
+
+def _new_counts(keys) -> dict:
+    """return an empty count table indexed by key, whose rows are added in place."""
+    return {
+        "keys": {key: np.empty(0, dtype=object) for key in keys},
+        "values": np.zeros((0, 2), dtype=np.int64),  # count_phys, count_virt
+        "size": 0,
+        "index": {},  # (key values...) -> row
+        "rows": {},  # failure type -> its rows
+    }
+
+
+def load_state(path=STATE_PATH) -> dict:
+    """load the persisted aggregate state, or start a new one."""
+    if not os.path.exists(path):
+        return new_state()
+    state = pd.read_pickle(path)
+    if isinstance(state["counts"], pd.DataFrame):
+        # states saved before the count table was indexed by key
+        counts, state["counts"] = state["counts"], _new_counts(state["by"] + [state["column"]])
+        _add(state["counts"], helper.cast_count_keys(counts))
+    return state
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pd.to_pickle(state, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def _reserve(counts, size):
+    """grow the arrays of a count table to hold size rows, doubling them so that adding rows is amortized O(1)."""
+    capacity = len(counts["values"])
+    if size <= capacity:
+        return
+    capacity, used = max(size, 2 * capacity), counts["size"]
+    values = np.zeros((capacity, 2), dtype=np.int64)
+    values[:used] = counts["values"][:used]
+    counts["values"] = values
+    for key, column in counts["keys"].items():
+        counts["keys"][key] = np.empty(capacity, dtype=object)
+        counts["keys"][key][:used] = column[:used]
+
+
+def _key_values(table, key) -> list:
+    """return a key column as python values, with None for missing values so that they hash alike."""
+    values = table[key].astype(object)
+    return values.where(values.notna(), None).tolist()
+
+
+def _add(counts, table):
+    """add the rows of a count table to an indexed one in place, in time proportional to the table."""
+    keys = list(counts["keys"])
+    columns = [_key_values(table, key) for key in keys]
+    index, size = counts["index"], counts["size"]
+    positions, new = np.empty(len(table), dtype=np.int64), []
+    for i, key in enumerate(zip(*columns)):
+        position = index.get(key)
+        if position is None:
+            position = index[key] = size + len(new)
+            counts["rows"].setdefault(key[-1], []).append(position)
+            new.append(i)
+        positions[i] = position
+    _reserve(counts, size + len(new))
+    for key, values in zip(keys, columns):
+        counts["keys"][key][size:size + len(new)] = [values[i] for i in new]
+    np.add.at(counts["values"], positions, table[["count_phys", "count_virt"]].to_numpy(dtype=np.int64))
+    counts["size"] = size + len(new)
+
+
+def _table(counts, positions) -> pd.DataFrame:
+    """return the given rows of an indexed count table as a count table."""
+    table = pd.DataFrame({key: column[positions] for key, column in counts["keys"].items()}).infer_objects()
+    table["count_phys"], table["count_virt"] = counts["values"][positions].T
+    return helper.cast_count_keys(table)
+
+
+def _rows(counts, types) -> pd.DataFrame:
+    """return the rows of the given failure types, looked up without scanning the other rows."""
+    rows = counts["rows"]
+    return _table(counts, np.array([p for t in types for p in rows.get(t, ())], dtype=np.int64))
+
+
+def get_counts(state) -> pd.DataFrame:
+    """return the whole aggregate count table of the state."""
+    return _table(state["counts"], np.arange(state["counts"]["size"]))
+
+
+def _labels(freq, types, column) -> pd.Series:
+    """return the class of each of types. types without failures yet have no class."""
+    freq = freq.reindex(types, fill_value=0).rename_axis(column).reset_index()
+    return helper.get_class_labels(freq, column)
+
+
+def _fold(parts, rows, dim) -> pd.DataFrame:
+    if dim == ALL:
+        return parts.sum().to_frame(ALL).T
+    return parts.groupby(rows[dim].to_numpy()).sum()
+
+
+def update(state, batch) -> pd.DataFrame:
+    """merge a batch count table into the state and return the types that changed class.
+
+    the batch rows are added to the aggregate in place and counted under their types' new classes.
+    only the types that changed class need their earlier rows, which are looked up by type and
+    moved from the old class to the new one, so an update costs in proportion to the batch and
+    those rows, not to the whole history."""
+    column = state["column"]
+    batch = helper.cast_count_keys(batch)
+    batch_freq = batch.groupby(column, observed=True)[["count_phys", "count_virt"]].sum()
+    types = batch_freq.index
+
+    old_labels = _labels(state["freq"], types, column)
+    state["freq"] = state["freq"].add(batch_freq, fill_value=0).astype("int64")
+    new_labels = _labels(state["freq"], types, column)
+    changed = old_labels.astype(object).to_numpy() != new_labels.astype(object).to_numpy()
+
+    old_rows = _rows(state["counts"], types[changed])
+    before = helper.get_class_counts(old_rows, old_labels, column=column)
+    after = helper.get_class_counts(old_rows, new_labels, column=column)
+    added = helper.get_class_counts(batch, new_labels, column=column)
+    _add(state["counts"], batch)
+
+    for dim, metrics in state["metrics"].items():
+        delta = _fold(added, batch, dim).add(_fold(after, old_rows, dim), fill_value=0).sub(_fold(before, old_rows, dim), fill_value=0)
+        state["metrics"][dim] = metrics.add(delta, fill_value=0).astype("int64")
+
+    state["batches"] += 1
+    transitions = pd.DataFrame({
+        "batch": state["batches"],
+        column: types[changed],
+        "before": old_labels[changed].to_numpy(),
+        "after": new_labels[changed].to_numpy(),
+    })
+    if not transitions.empty:
+        state["transitions"] = pd.concat([state["transitions"], transitions], ignore_index=True)
+    return transitions
+
+
+def get_precision_recall(state, by=ALL) -> pd.DataFrame:
+    """return precision and recall (in %) of a dimension maintained by the state.
+
+    the android_version dimension can be grouped by major version with by="android_major"."""
+    if by == "android_major":
+        metrics = state["metrics"]["android_version"]
+        metrics = metrics.groupby(np.floor(metrics.index.to_numpy(dtype=float))).sum()
+    else:
+        metrics = state["metrics"][by].copy()
+    return helper.add_precision_recall(metrics)
+
+
+def append(path, state_path=STATE_PATH, chunksize=stream.CHUNKSIZE) -> pd.DataFrame:
+    """fold one export archive into the persisted state and return the class transitions it caused."""
+    state = load_state(state_path)
+    batch = stream.aggregate(path, by=state["by"], column=state["column"], chunksize=chunksize)
+    transitions = update(state, batch)
+    save_state(state, state_path)
+    return transitions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge daily failure exports into the persisted aggregate state.")
+    parser.add_argument("paths", nargs="+", help="export archives, in the order they should be applied")
+    parser.add_argument("--state", default=STATE_PATH, help="path of the aggregate state")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        transitions = append(path, state_path=args.state)
+        print(f"{path}: {len(transitions)} failure types changed class.")
+        if not transitions.empty:
+            print(transitions.to_string(index=False))
+
+    overall = get_precision_recall(load_state(args.state)).iloc[0]
+    print(f"The overall precision and recall are {round(overall['precision'], 1)}% and {round(overall['recall'], 1)}% respectively.")
@@ -0,0 +1,233 @@
+import cProfile
+import functools
+import inspect
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+REPORT_PATH = "./.cache/report.json"
+
+# what the peak_mb of a report measures in each memory mode
+MEMORY_NOTES = {
+    "rss": "peak resident set size of the stage; children_peak_mb is that of the largest child process so far",
+    "trace": "peak traced python allocations (tracemalloc); timings include its overhead, often several times on python-heavy stages",
+    None: "not recorded",
+}
+
+_recorder = None  # the active Recorder, if any
+_originals = {}  # (module, name) -> function replaced by instrument_module
+
+
+def _rows(value):
+    """return the number of rows of a frame, series or array, or None."""
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    return None
+
+
+def _children_cpu() -> float:
+    """cpu seconds used by terminated child processes, e.g. figure rendering workers."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _max_rss(who) -> int:
+    """peak resident set size in bytes of this process, or of its largest terminated child."""
+    if resource is None:
+        return 0
+    return resource.getrusage(who).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def _reset_rss():
+    """reset the peak resident set size of this process, where the os allows it (linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _after_fork():
+    # pool workers do not record, so they do not pay for tracing either
+    if _recorder is not None and _recorder.memory == "trace" and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class Recorder:
+    """records wall time, cpu time, peak memory and rows in/out of nested pipeline stages.
+
+    cpu time includes the child processes that finished during a stage. memory="rss" records the peak
+    resident set size at no cost to the timings; it is reset at every stage on linux, and is the peak of
+    the run so far elsewhere. stages whose child processes finished also get the peak of the largest child.
+    memory="trace" records the peak of the python allocations traced by tracemalloc instead, which slows
+    python-heavy code down several times and leaves the timings unreliable; memory=None records none.
+    profile names a top-level stage to run under cProfile, or "hot" to profile them all and keep the
+    slowest one."""
+
+    def __init__(self, memory="rss", profile=None):
+        if memory not in ("rss", "trace", None):
+            raise ValueError(f"unknown memory mode: {memory}")
+        self.memory = memory
+        self.profile = profile
+        self.records = []
+        self.profiles = {}  # stage name -> pstats-compatible profile
+        self.pid = os.getpid()
+        self._stack = []
+
+    def start(self):
+        global _recorder
+        if self.memory == "trace" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _recorder = self
+        return self
+
+    def stop(self):
+        global _recorder
+        _recorder = None
+        if self.memory == "trace" and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _peak(self) -> int:
+        if self.memory == "trace":
+            return tracemalloc.get_traced_memory()[1]
+        if self.memory == "rss":
+            return _max_rss(resource.RUSAGE_SELF) if resource is not None else 0
+        return 0
+
+    def _reset_peak(self):
+        if self.memory == "trace":
+            tracemalloc.reset_peak()
+        elif self.memory == "rss":
+            _reset_rss()
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """record a stage. the yielded dict takes rows_out (and any other field) for the report."""
+        record = {"stage": name, "depth": len(self._stack), "rows_in": rows_in, "rows_out": None}
+        if self._stack:
+            # the parent keeps the peak reached so far, since the child resets it
+            self._stack[-1]["_peak"] = max(self._stack[-1]["_peak"], self._peak())
+        self._reset_peak()
+        record["_peak"] = 0
+        self._stack.append(record)
+        self.records.append(record)
+        profiler = None
+        if not record["depth"] and self.profile in (name, "hot"):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        wall, cpu, children = time.perf_counter(), time.process_time(), _children_cpu()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall, 4)
+            record["cpu_s"] = round(time.process_time() - cpu + _children_cpu() - children, 4)
+            if profiler is not None:
+                profiler.disable()
+                self.profiles[name] = profiler
+            peak = max(record.pop("_peak"), self._peak())
+            record["peak_mb"] = round(peak / 2 ** 20, 2) if self.memory else None
+            if self.memory == "rss" and _children_cpu() > children:
+                record["children_peak_mb"] = round(_max_rss(resource.RUSAGE_CHILDREN) / 2 ** 20, 2)
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]["_peak"] = max(self._stack[-1]["_peak"], peak)
+            self._reset_peak()
+
+    def summary(self) -> pd.DataFrame:
+        """return the calls, total wall/cpu time, max peak memory and rows of every stage, slowest first."""
+        columns = ["rows_in", "rows_out", "peak_mb", "children_peak_mb"]
+        records = pd.DataFrame(self.records, columns=["stage", "wall_s", "cpu_s"] + columns)
+        records[columns] = records[columns].apply(pd.to_numeric)
+        summary = records.groupby("stage", sort=False).agg(
+            calls=("wall_s", "size"), wall_s=("wall_s", "sum"), cpu_s=("cpu_s", "sum"), peak_mb=("peak_mb", "max"),
+            children_peak_mb=("children_peak_mb", "max"), rows_in=("rows_in", "max"), rows_out=("rows_out", "max"))
+        summary[["rows_in", "rows_out"]] = summary[["rows_in", "rows_out"]].astype("Int64")
+        return summary.sort_values("wall_s", ascending=False)
+
+    def report(self) -> dict:
+        """return the records with the environment they were taken in, as json-serializable values."""
+        return {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "argv": sys.argv,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "cpus": os.cpu_count(),
+            "memory": MEMORY_NOTES[self.memory],
+            "stages": [{k: (v.item() if isinstance(v, np.generic) else v) for k, v in r.items()} for r in self.records],
+        }
+
+    def save(self, path=REPORT_PATH):
+        """write the json report to path and, if a stage was profiled, the slowest one's profile next to it."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        if self.profiles:
+            walls = {r["stage"]: r["wall_s"] for r in self.records if not r["depth"]}
+            hot = max(self.profiles, key=lambda name: walls.get(name, 0))
+            profile_path = os.path.splitext(path)[0] + f"-{hot}.prof"
+            self.profiles[hot].dump_stats(profile_path)
+            return profile_path
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """record a stage in the active recorder; a no-op when instrumentation is off."""
+    if _recorder is None or os.getpid() != _recorder.pid:
+        yield {}
+    else:
+        with _recorder.stage(name, rows_in=rows_in) as record:
+            yield record
+
+
+def traced(func, name=None):
+    """wrap func so that each call is recorded as a stage, with the rows of its first argument and result."""
+    name = name or f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # worker processes inherit the patched modules; only the recording process records
+        if _recorder is None or os.getpid() != _recorder.pid:
+            return func(*args, **kwargs)
+        with _recorder.stage(name, rows_in=_rows(args[0]) if args else None) as record:
+            result = func(*args, **kwargs)
+            record["rows_out"] = _rows(result)
+        return result
+
+    return wrapper
+
+
+def instrument_module(module):
+    """record every call to the public functions of module, including the calls between them.
+
+    generator functions are left alone, since their work happens after they return."""
+    for name, func in list(vars(module).items()):
+        if (inspect.isfunction(func) and func.__module__ == module.__name__ and not name.startswith("_")
+                and not inspect.isgeneratorfunction(func)):
+            setattr(module, name, traced(_originals.setdefault((module, name), func)))
+
+
+def restore_modules():
+    """undo instrument_module."""
+    for (module, name), func in _originals.items():
+        setattr(module, name, func)
+    _originals.clear()
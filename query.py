@@ -0,0 +1,201 @@
+import argparse
+import functools
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import cache
+import helper
+import stack
+import window
+
+
+COLUMNS = ["type", "error", "failure_time", "app_id", "device_brand", "device_model", "android_version"]
+FILTERS = ["app_id", "device_brand", "device_model", "android_version", "error"]
+CACHE_SIZE = 256  # filter bitmaps and query results kept in memory
+
+
+class FailureIndex:
+    """categorical indexes over the failure data, for filtered precision/recall queries in milliseconds.
+
+    every filter column is stored as codes plus the rows of each code; filters are turned into packed
+    bitmaps, which are and-ed together and kept in an lru cache along with whole query results."""
+
+    def __init__(self, df, column="type", cache_size=CACHE_SIZE):
+        self.n = len(df)
+        self.cache_size = cache_size
+        self.values, self.codes, self.offsets, self.order = {}, {}, {}, {}
+        for key in FILTERS:
+            codes, values = pd.factorize(df[key], sort=True)
+            self.values[key], self.codes[key] = np.asarray(values), codes.astype(np.int32)
+            # rows with a missing value get no posting list
+            self.offsets[key], order = stack.csr(np.where(codes < 0, len(values), codes), len(values) + 1)
+            self.order[key] = order[:self.offsets[key][-2]]
+        self.times = window.TimeIndex(df["failure_time"])
+
+        type_codes, self.types = pd.factorize(df[column], sort=True)
+        self.type_codes = type_codes.astype(np.int32)
+        self.virt = (df["device_model"] == "virt").to_numpy()
+        valid = self.type_codes >= 0
+        totals = self._fold(self.type_codes[valid], self.virt[valid], np.zeros(valid.sum(), dtype=np.int64), 1)
+        self.labels = helper.get_class_codes(totals[0, 0] > 0, totals[0, 1] > 0)
+        self._init_caches()
+
+    def _init_caches(self):
+        self._bitmap = functools.lru_cache(maxsize=self.cache_size)(self._build_bitmap)
+        self._query = functools.lru_cache(maxsize=self.cache_size)(self._run_query)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_bitmap"], state["_query"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_caches()
+
+    def _fold(self, t, virt, g, n_groups) -> np.ndarray:
+        """return the phys and virt failure counts of every (group, type), shaped (group, phys/virt, type)."""
+        n_types = len(self.types)
+        cell = (g * 2 + virt) * n_types + t
+        return np.bincount(cell, minlength=n_groups * 2 * n_types).reshape(n_groups, 2, n_types)
+
+    def _match(self, key, values) -> np.ndarray:
+        """return the codes of key matching any of values. a whole android version matches its minor versions."""
+        known = self.values[key]
+        if key == "android_version":
+            versions = np.asarray(values, dtype=np.float64)
+            whole = versions == np.floor(versions)
+            known = known.astype(np.float32)
+            hits = np.isin(np.floor(known), versions[whole]) | np.isin(known, versions[~whole].astype(np.float32))
+        elif np.issubdtype(known.dtype, np.number):
+            hits = np.isin(known, np.asarray(values, dtype=known.dtype))
+        else:
+            hits = np.isin(known.astype(str), [str(v) for v in values])
+        return np.flatnonzero(hits)
+
+    def _build_bitmap(self, key, values) -> np.ndarray:
+        mask = np.zeros(self.n, dtype=bool)
+        if key == "failure_time":
+            mask[self.times.rows(*values)] = True
+        else:
+            mask[stack.gather(self.offsets[key], self.order[key], self._match(key, values))] = True
+        return np.packbits(mask)
+
+    def mask(self, filters=None, start=None, end=None) -> np.ndarray:
+        """return a boolean mask of the failures matching every filter and start <= failure_time < end.
+
+        filters maps a column of FILTERS to a value or a list of accepted values."""
+        return self._mask(_normalize(filters, start, end))
+
+    def _mask(self, items) -> np.ndarray:
+        bits = None
+        for key, values in items:
+            bitmap = self._bitmap(key, values)
+            bits = bitmap if bits is None else bits & bitmap
+        if bits is None:
+            return np.ones(self.n, dtype=bool)
+        return np.unpackbits(bits, count=self.n).astype(bool)
+
+    def _run_query(self, items, by, classes) -> pd.DataFrame:
+        rows = np.flatnonzero(self._mask(items))
+        t, virt = self.type_codes[rows], self.virt[rows]
+        if by is None:
+            g, index = np.zeros(len(rows), dtype=np.int64), pd.RangeIndex(1)
+        else:
+            g = self.codes[by][rows].astype(np.int64)
+            index = pd.Index(self.values[by], name=by)
+        valid = (t >= 0) & (g >= 0)
+        counts = self._fold(t[valid], virt[valid], g[valid], len(index))
+        phys, virt = counts[:, 0], counts[:, 1]
+
+        if classes == "global":
+            labels = self.labels
+        else:
+            labels = helper.get_class_codes(phys.sum(axis=0) > 0, virt.sum(axis=0) > 0)
+        metrics = pd.DataFrame({
+            "count_phys": phys.sum(axis=1),
+            "count_virt": virt.sum(axis=1),
+            "tp_phys": phys[:, labels == 0].sum(axis=1),
+            "tp_virt": virt[:, labels == 0].sum(axis=1),
+            "fp": (phys + virt)[:, labels == 1].sum(axis=1),
+            "fn": (phys + virt)[:, labels == 2].sum(axis=1),
+        }, index=index)
+        metrics = helper.add_precision_recall(metrics)
+        if by is not None:
+            metrics = metrics[metrics["count_phys"] + metrics["count_virt"] > 0]
+        return metrics
+
+    def query(self, filters=None, start=None, end=None, by=None, classes="global") -> pd.DataFrame:
+        """return the failure counts, tp/fp/fn counts, precision and recall (in %) of the matching failures.
+
+        by splits the result by one of FILTERS. with classes="global", failure types keep the class
+        they have on the whole dataset, as in plot.py; with classes="query", they are labelled from
+        the matching failures only."""
+        if classes not in ("global", "query"):
+            raise ValueError(f"unknown classes: {classes}")
+        if by is not None and by not in FILTERS:
+            raise ValueError(f"unknown key: {by}")
+        return self._query(tuple(_normalize(filters, start, end)), by, classes).copy()
+
+
+def _normalize(filters, start=None, end=None) -> list:
+    """return filters as a sorted list of (key, tuple of values), which can key a cache."""
+    items = []
+    for key, values in sorted((filters or {}).items()):
+        if key not in FILTERS:
+            raise ValueError(f"unknown key: {key}")
+        if values is None:
+            continue
+        if np.isscalar(values):
+            values = [values]
+        items.append((key, tuple(sorted(values, key=str))))
+    if start is not None or end is not None:
+        items.append(("failure_time", (start, end)))
+    return items
+
+
+def get_index_path(path, cache_dir=cache.CACHE_DIR) -> str:
+    """return the path of the pickled index of an archive, next to its columnar cache."""
+    return cache.get_cache_path(path, cache_dir).replace(".npz", "-index.pkl")
+
+
+def load_index(path="data.zip", cache_dir=cache.CACHE_DIR) -> FailureIndex:
+    """load the index of the failure data, building and persisting it on first use."""
+    index_path = get_index_path(path, cache_dir)
+    if os.path.exists(index_path):
+        # the state is pickled rather than the object, so that the cli and importers share the file
+        index = FailureIndex.__new__(FailureIndex)
+        index.__setstate__(pd.read_pickle(index_path))
+        return index
+    index = FailureIndex(cache.load_data(path, columns=COLUMNS, cache_dir=cache_dir))
+    pd.to_pickle(index.__getstate__(), index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query precision/recall and failure counts of a subset of the failure data.")
+    parser.add_argument("--data", default="data.zip", help="failure data archive")
+    parser.add_argument("--app", type=int, nargs="+", help="app ids")
+    parser.add_argument("--brand", nargs="+", help="device brands")
+    parser.add_argument("--model", nargs="+", help="device models")
+    parser.add_argument("--version", type=float, nargs="+", help="android versions; a whole version (e.g. 11) matches its minor versions")
+    parser.add_argument("--error", nargs="+", help="exceptions or signals")
+    parser.add_argument("--start", default=None, help="earliest failure time, e.g. 2022-01-01")
+    parser.add_argument("--end", default=None, help="failure time upper bound (exclusive)")
+    parser.add_argument("--by", choices=FILTERS, default=None, help="split the result by a column")
+    parser.add_argument("--classes", choices=["global", "query"], default="global",
+                        help="label failure types from the whole dataset or from the matching failures")
+    args = parser.parse_args()
+
+    index = load_index(args.data)
+    filters = {"app_id": args.app, "device_brand": args.brand, "device_model": args.model,
+               "android_version": args.version, "error": args.error}
+    start = time.perf_counter()
+    result = index.query(filters, start=args.start, end=args.end, by=args.by, classes=args.classes)
+    seconds = time.perf_counter() - start
+    print(result.round(1).to_string())
+    print(f"Answered in {seconds * 1000:.1f} ms.")
@@ -0,0 +1,260 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+# GLOBAL CONSTANTS
+
+PATH_TO_FIGURES = "./fig/"
+AGGREGATES_PATH = "./.cache/aggregates.pkl"
+FIGSIZE=(11, 7)
+LEGEND_FONTSIZE = 28
+LABEL_FONTSIZE = 40
+hatches = ['xx', '\\\\', '//', '--', '++', '||', 'o', 'O', '.', '*']
+width = 0.35  # the width of the bars
+line_width = 3.5
+colors = ['#7F449B', '#009D72', '#E5A023']
+font = {'family': 'Arial',
+        'weight' : 'normal',
+        'size'   : 40}
+bar_common_args = {"linewidth": line_width, "zorder": 3, "facecolor": "white"}
+bar1_args = {"edgecolor": colors[0], "hatch": hatches[0]}
+bar2_args = {"edgecolor": colors[1], "hatch": hatches[1]}
+errorbar_args = {"elinewidth": line_width / 2, "capsize": 6, "capthick": line_width / 2, "zorder": 4}
+
+
+def _pyplot():
+    """return pyplot on the non-interactive Agg backend, styled for the paper."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.rc('font', **font)
+    plt.rcParams.update({'legend.handlelength': 1.3, 'legend.borderpad': 0.25, "legend.labelspacing": 0.25, "legend.handletextpad": 0.5})
+    plt.rcParams['hatch.linewidth'] = line_width
+    return plt
+
+
+def _legend(ax, handles, loc, bbox_to_anchor, **kwargs):
+    ax.legend(handles=handles, loc=loc, bbox_to_anchor=bbox_to_anchor, fontsize=LEGEND_FONTSIZE, edgecolor='black', fancybox=False, **kwargs)
+
+
+def plot_fig1(data):
+    """Figure 1: Precision/recall of the test results on virtualized devices, relative to those on physical devices."""
+    plt = _pyplot()
+    import matplotlib.patches as mpatches
+
+    f, ax = plt.subplots(figsize=FIGSIZE)
+
+    x = np.arange(len(data["app_id"]))  # the label locations
+
+    ax.bar(x - width/2 - 0.0, data["precision"], label="Precision", width=width, yerr=data.get("precision_err"), error_kw=errorbar_args, **bar_common_args, **bar1_args)
+    ax.bar(x + width/2 + 0.0, data["recall"], label="Recall", width=width, yerr=data.get("recall_err"), error_kw=errorbar_args, **bar_common_args, **bar2_args)
+
+    # Add some text for labels, title and custom x-axis tick labels, etc.
+    ax.set_ylabel('Precision / Recall (%)', size = LABEL_FONTSIZE)
+    ax.set_xlabel('App ID', size = LABEL_FONTSIZE)
+    ax.set_xticks(x, data["app_id"])
+    ax.set_ylim((90, 100))
+
+    circ1 = mpatches.Patch(label="Precision", **bar_common_args, **bar1_args)
+    circ2 = mpatches.Patch(label='Recall', **bar_common_args, **bar2_args)
+    _legend(ax, [circ1, circ2], 'upper left', (-0.005, 1.005))
+    return f
+
+
+def plot_fig2(data):
+    """Figure 2: Precision and recall of the test results on virtualized devices for each Android version."""
+    plt = _pyplot()
+    import matplotlib.patches as mpatches
+
+    f, ax = plt.subplots(figsize=FIGSIZE)
+
+    x = np.asarray(data["versions"])  # the label locations
+
+    ax.bar(x - width/2 - 0.0, data["precision"], label="Precision", width=width, yerr=data.get("precision_err"), error_kw=errorbar_args, **bar_common_args, **bar1_args)
+    ax.bar(x + width/2 + 0.0, data["recall"], label="Recall", width=width, yerr=data.get("recall_err"), error_kw=errorbar_args, **bar_common_args, **bar2_args)
+
+    # Add some text for labels, title and custom x-axis tick labels, etc.
+    ax.set_ylabel('Precision / Recall (%)', size = LABEL_FONTSIZE)
+    ax.set_xlabel('Android Version', size = LABEL_FONTSIZE)
+    ax.set_xticks(x, data["versions"])
+    ax.set_ylim((90, 100))
+
+    circ1 = mpatches.Patch(label="Precision", **bar_common_args, **bar1_args)
+    circ2 = mpatches.Patch(label='Recall', **bar_common_args, **bar2_args)
+    _legend(ax, [circ1, circ2], 'upper left', (-0.005, 1.005))
+    return f
+
+
+def plot_fig3(data):
+    """Figure 3: Average failure occurrence frequency per device per test round for different Android versions."""
+    plt = _pyplot()
+    import matplotlib.patches as mpatches
+
+    f, ax = plt.subplots(figsize=(11.7, 7))
+
+    x = np.arange(len(data["versions"]))  # the label locations
+    ax.bar(x - width/2 - 0.0, data["freq_phys"], label="Physical", width=width, **bar_common_args, **bar1_args)
+    ax.bar(x + width/2 + 0.0, data["freq_virt"], label="Virtualized", width=width, **bar_common_args, **bar2_args)
+
+    # Add some text for labels, title and custom x-axis tick labels, etc.
+    ax.set_ylabel('Number of Events', fontsize = LABEL_FONTSIZE)
+    ax.set_xlabel('Android Version', fontsize = LABEL_FONTSIZE)
+    ax.set_ylim((0.2, 1.0))
+
+    ax.set_xticks(x, data["versions"])
+    circ1 = mpatches.Patch(label="Physical", **bar_common_args, **bar1_args)
+    circ2 = mpatches.Patch(label='Virtualized', **bar_common_args, **bar2_args)
+    _legend(ax, [circ1, circ2], 'upper right', (1.005, 1.005))
+    return f
+
+
+def plot_fig4(data):
+    """Figure 4: Average failure occurrence frequency per device per test round for each studied app."""
+    plt = _pyplot()
+    import matplotlib.patches as mpatches
+
+    f, ax = plt.subplots(figsize=FIGSIZE)
+
+    x = np.arange(len(data["app_id"]))  # the label locations
+    ax.bar(x - width/2 - 0.0, data["freq_phys"], label="Physical", width=width, **bar_common_args, **bar1_args)
+    ax.bar(x + width/2 + 0.0, data["freq_virt"], label="Virtualized", width=width, **bar_common_args, **bar2_args)
+
+    # Add some text for labels, title and custom x-axis tick labels, etc.
+    ax.set_ylabel('Number of Events', size = LABEL_FONTSIZE)
+    ax.set_xlabel('App ID', size = LABEL_FONTSIZE)
+    ax.set_xticks(x, data["app_id"])
+    ax.set_ylim((0.00, 1.0))
+
+    circ1 = mpatches.Patch(label="Physical", **bar_common_args, **bar1_args)
+    circ2 = mpatches.Patch(label='Virtualized', **bar_common_args, **bar2_args)
+    _legend(ax, [circ1, circ2], 'upper right', (1.005, 1.005))
+    return f
+
+
+def plot_fig5(data):
+    """Figure 5: Test precision/recall on our virtualized devices for each app, before and after applying our enhancements."""
+    plt = _pyplot()
+    import matplotlib.patches as mpatches
+
+    precision, recall = np.asarray(data["precision"]), np.asarray(data["recall"])
+    precision_diff = np.array(data["precision_post"]) - precision
+    recall_diff = np.array(data["recall_post"]) - recall
+
+    f, ax = plt.subplots(figsize=FIGSIZE)
+    x = np.arange(len(data["app_id"]))  # the label locations
+    ax.bar(x - width/2 - 0.0, precision, label="Precision", width=width, **bar_common_args, **bar1_args)
+    ax.bar(x + width/2 + 0.0, recall, label="Recall", width=width, **bar_common_args, **bar2_args)
+    ax.bar(x - width/2 - 0.0 , precision_diff, label='Precision', width=width, edgecolor=colors[2], bottom=precision, hatch=hatches[2], **bar_common_args)
+    ax.bar(x + width/2 + 0.0, recall_diff, label='Recall', width=width, edgecolor=colors[2], bottom=recall, hatch=hatches[2], **bar_common_args)
+
+    # Add some text for labels, title and custom x-axis tick labels, etc.
+    ax.set_ylabel('Precision / Recall (%)', size = LABEL_FONTSIZE)
+    ax.set_xlabel('App ID', size = LABEL_FONTSIZE)
+    ax.set_xticks(x, data["app_id"])
+    ax.set_ylim((90, 102.8))
+    ax.set_yticks([90, 92.5, 95, 97.5, 100], ["90.0", "92.5", "95", "97.5", "100"])
+
+    circ1 = mpatches.Patch(label="Original Precision", **bar_common_args, **bar1_args)
+    circ2 = mpatches.Patch(label='Original Recall', **bar_common_args, **bar2_args)
+    circ3 = mpatches.Patch(label = 'Enhancement', **bar_common_args, edgecolor=colors[2], hatch=hatches[2])
+    _legend(ax, [circ1, circ2, circ3], 'upper left', (-0.005, 1.005), ncol=2)
+    return f
+
+
+def get_bbox_text(stats):
+    bbox_text = f"Max = {round(stats['max'],2)}%\nMean = {round(stats['mean'],2)}%\nMedian = {round(stats['median'],2)}%\nMin = {round(stats['min'],2)}%"
+    return bbox_text
+
+
+def plot_fig6(data):
+    """Figure 6: Frequency difference between virtualized and physical devices for each failure type after enhancements."""
+    plt = _pyplot()
+    x, cdf = data["ecdf"]
+
+    f, ax = plt.subplots(figsize=(9.6, 7))
+    ax.set_ylim((0, 1))
+    ax.set_yticks([0, 0.2, 0.4, 0.6 ,0.8, 1], ['0', '0.2', '0.4', '0.6' ,'0.8', '1'])
+    ax.set_xlim((-250, 250))
+
+    ax.set_xlabel('Frequency Difference (%)', fontsize = LABEL_FONTSIZE)
+    ax.set_ylabel('CDF', fontsize = LABEL_FONTSIZE)
+    ax.set_xticks([-200, 0, 200], ['-200','0','200'])
+
+    # plot the exact empirical CDFs as step functions: the published one, and the one measured on the released data
+    if len(x):
+        ax.step(np.r_[x[0], x], np.r_[0, cdf], where='post', color = 'blue', zorder=1, clip_on=False, linewidth=3, label='Published')
+    if "measured_ecdf" in data:
+        x, cdf = data["measured_ecdf"]
+        if len(x):
+            ax.step(np.r_[x[0], x], np.r_[0, cdf], where='post', color = 'red', linestyle='--', zorder=1, clip_on=False, linewidth=3, label='Measured')
+        ax.legend(loc='lower right', bbox_to_anchor=(1.005, -0.005), fontsize=LEGEND_FONTSIZE, edgecolor='black', fancybox=False)
+    bbox = dict(boxstyle="square,pad=0.3", facecolor='none', edgecolor='black')
+    ax.annotate(xy=(-210, 0.55), xycoords='data',
+                xytext=(-210, 0.55), textcoords="data", fontsize = LEGEND_FONTSIZE, linespacing=1.5, text=get_bbox_text(data["stats"]), bbox=bbox)
+    return f
+
+
+# figure name -> (output file, plotting function)
+FIGURES = {
+    "fig1": ("fig1_pre_recall_app.pdf", plot_fig1),
+    "fig2": ("fig2_pre_recall_os.pdf", plot_fig2),
+    "fig3": ("fig3_freq_os.pdf", plot_fig3),
+    "fig4": ("fig4_freq_app.pdf", plot_fig4),
+    "fig5": ("fig5_pre_recall_app_enhanced.pdf", plot_fig5),
+    "fig6": ("fig6_freq_discrepancy_cdf.pdf", plot_fig6),
+}
+
+
+def save_aggregates(aggregates, path=AGGREGATES_PATH):
+    """persist the per-figure inputs, so that figures can be re-rendered without the failure data."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pd.to_pickle(aggregates, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def load_aggregates(path=AGGREGATES_PATH) -> dict:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found. Run plot.py once to compute the aggregates.")
+    return pd.read_pickle(path)
+
+
+def render(name, data, path_to_figures=PATH_TO_FIGURES) -> str:
+    """render one figure to its pdf file and return the file path."""
+    filename, plot = FIGURES[name]
+    os.makedirs(path_to_figures, exist_ok=True)
+    path = os.path.join(path_to_figures, filename)
+    f = plot(data)
+    f.savefig(path, format = "pdf", bbox_inches = 'tight')
+    _pyplot().close(f)
+    return path
+
+
+def render_all(aggregates, names=None, path_to_figures=PATH_TO_FIGURES, n_jobs=None) -> list:
+    """render figures concurrently, one process per figure, and return their file paths."""
+    names = [n for n in FIGURES if n in aggregates] if names is None else list(names)
+    n_jobs = min(len(names), n_jobs or os.cpu_count() or 1)
+    if n_jobs <= 1:
+        return [render(name, aggregates[name], path_to_figures) for name in names]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(render, name, aggregates[name], path_to_figures) for name in names]
+        return [f.result() for f in futures]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-render figures from the aggregates cached by plot.py.")
+    parser.add_argument("figures", nargs="*", help=f"figures to render, among {', '.join(FIGURES)} (default: all)")
+    parser.add_argument("--aggregates", default=AGGREGATES_PATH, help="path of the cached aggregates")
+    parser.add_argument("--out", default=PATH_TO_FIGURES, help="output directory")
+    parser.add_argument("--jobs", type=int, default=None, help="number of rendering processes")
+    args = parser.parse_args()
+    unknown = [name for name in args.figures if name not in FIGURES]
+    if unknown:
+        parser.error(f"unknown figures: {', '.join(unknown)}")
+
+    for path in render_all(load_aggregates(args.aggregates), names=args.figures or None, path_to_figures=args.out, n_jobs=args.jobs):
+        print(f"Saved {path}")
@@ -0,0 +1,208 @@
+import ast
+import functools
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# a python string literal, as written by repr()
+_STR = r"""'[^'\\]*(?:\\.[^'\\]*)*'|"[^"\\]*(?:\\.[^"\\]*)*\""""
+FRAME_RE = re.compile(rf"\{{'file': ({_STR}), 'method': ({_STR}), 'line_number': ({_STR}|-?\d+|None)\}}")
+# a frame or the newline between two stacks, to match many joined stacks at once
+_FRAMES_RE = re.compile(rf"{FRAME_RE.pattern}|(\n)")
+_FRAME_LAYOUT = "{'file': , 'method': , 'line_number': }"
+
+
+def _literal(token):
+    if token[0] in "'\"" and "\\" not in token:
+        return token[1:-1]
+    return ast.literal_eval(token)
+
+
+def _line_number(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def parse_stack(stack_frame) -> list:
+    """parse one stack_frame value into a list of (file, method, line_number) tuples.
+
+    the regular repr() layout is matched with a regex; anything else falls back to ast.literal_eval."""
+    if not isinstance(stack_frame, str):
+        return []
+    matches = FRAME_RE.findall(stack_frame)
+    if FRAME_RE.sub("", stack_frame).replace(", ", "") == "[]":
+        return [(_literal(f), _literal(m), _line_number(_literal(l))) for f, m, l in matches]
+    try:
+        frames = ast.literal_eval(stack_frame)
+    except (ValueError, SyntaxError):
+        return []
+    return [(str(d.get("file")), str(d.get("method")), _line_number(d.get("line_number")))
+            for d in frames if isinstance(d, dict)]
+
+
+def csr(keys, n):
+    """return the offsets of a csr layout over keys sorted by id, plus the sorting order."""
+    order = np.argsort(keys, kind="stable")
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=offsets[1:])
+    return offsets, order
+
+
+def gather(offsets, values, ids):
+    """concatenate values[offsets[i]:offsets[i + 1]] for every i in ids, without a python loop."""
+    starts = offsets[ids]
+    lengths = offsets[ids + 1] - starts
+    shift = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return values[shift + np.arange(lengths.sum())]
+
+
+class StackIndex:
+    """array-backed stack frames of a failure table.
+
+    identical stacks are stored once. frames of stack s are frame_*[stack_offsets[s]:stack_offsets[s + 1]],
+    and failure row i has stack stack_ids[i]. files and methods are interned into integer ids."""
+
+    def __init__(self, files, methods, frame_file, frame_method, frame_line, stack_offsets, stack_ids):
+        self.files = files
+        self.methods = methods
+        self.file_ids = {f: i for i, f in enumerate(files)}
+        self.method_ids = {m: i for i, m in enumerate(methods)}
+        self.frame_file = frame_file
+        self.frame_method = frame_method
+        self.frame_line = frame_line
+        self.stack_offsets = stack_offsets
+        self.stack_ids = stack_ids
+
+        n_stacks = len(stack_offsets) - 1
+        self.frame_stack = np.repeat(np.arange(n_stacks, dtype=np.int32), np.diff(stack_offsets))
+
+    # the lookup indexes are built on first use, since stack signatures and scans do not need them
+    @functools.cached_property
+    def _stack_rows(self):
+        return csr(self.stack_ids, len(self.stack_offsets) - 1)
+
+    @functools.cached_property
+    def _method_stacks(self):
+        return self._build_inverted(self.frame_method, len(self.methods))
+
+    @functools.cached_property
+    def _file_stacks(self):
+        return self._build_inverted(self.frame_file, len(self.files))
+
+    def _build_inverted(self, frame_key, n):
+        """map every key id to the sorted stacks whose frames contain it."""
+        n_stacks = len(self.stack_offsets) - 1
+        pairs = np.unique(frame_key.astype(np.int64) * max(n_stacks, 1) + self.frame_stack)
+        keys, stacks = np.divmod(pairs, max(n_stacks, 1))
+        offsets, _ = csr(keys, n)
+        return offsets, stacks
+
+    @property
+    def row_starts(self) -> np.ndarray:
+        return self.stack_offsets[self.stack_ids]
+
+    @property
+    def row_ends(self) -> np.ndarray:
+        return self.stack_offsets[self.stack_ids + 1]
+
+    def __len__(self):
+        return len(self.stack_ids)
+
+    def frames(self, row) -> pd.DataFrame:
+        """return the frames of one failure row."""
+        s = slice(self.stack_offsets[self.stack_ids[row]], self.stack_offsets[self.stack_ids[row] + 1])
+        return pd.DataFrame({
+            "file": [self.files[i] for i in self.frame_file[s]],
+            "method": [self.methods[i] for i in self.frame_method[s]],
+            "line_number": self.frame_line[s],
+        })
+
+    def _rows_of_stacks(self, stacks) -> np.ndarray:
+        offsets, rows = self._stack_rows
+        return np.sort(gather(offsets, rows, np.asarray(stacks, dtype=np.int64)))
+
+    def rows_with_method(self, method) -> np.ndarray:
+        """return the failure rows whose stack contains method."""
+        if method not in self.method_ids:
+            return np.array([], dtype=np.int64)
+        m = self.method_ids[method]
+        offsets, stacks = self._method_stacks
+        return self._rows_of_stacks(stacks[offsets[m]:offsets[m + 1]])
+
+    def rows_with_file(self, file) -> np.ndarray:
+        """return the failure rows whose stack contains file."""
+        if file not in self.file_ids:
+            return np.array([], dtype=np.int64)
+        f = self.file_ids[file]
+        offsets, stacks = self._file_stacks
+        return self._rows_of_stacks(stacks[offsets[f]:offsets[f + 1]])
+
+    def rows_with_frame(self, file, method) -> np.ndarray:
+        """return the failure rows whose stack contains a frame of method in file."""
+        if file not in self.file_ids or method not in self.method_ids:
+            return np.array([], dtype=np.int64)
+        match = (self.frame_file == self.file_ids[file]) & (self.frame_method == self.method_ids[method])
+        return self._rows_of_stacks(np.unique(self.frame_stack[match]))
+
+
+def _intern(tokens, decode) -> tuple:
+    """return the id of every raw token and the distinct decoded values, decoding each distinct token once."""
+    codes, uniques = pd.factorize(np.asarray(tokens, dtype=object))
+    ids, values = pd.factorize(pd.Series([decode(t) for t in uniques], dtype=object))
+    return ids[codes].astype(np.int32), list(values)
+
+
+def parse_stack_frames(stack_frames) -> StackIndex:
+    """parse a stack_frame column into a StackIndex. every distinct stack is parsed only once.
+
+    stacks in the regular repr() layout are matched in one regex pass over all of them, and recognized
+    by their length: "[", the frames joined by ", " and "]". the others go through parse_stack and are
+    re-encoded as raw tokens, so that both kinds are interned the same way."""
+    codes, uniques = pd.factorize(pd.Series(stack_frames))
+    # missing stacks map to an extra empty stack at the end
+    codes = np.where(codes < 0, len(uniques), codes).astype(np.int32)
+
+    values = pd.Series(uniques, dtype=object)
+    candidates = np.flatnonzero([isinstance(v, str) and v[:1] == "[" and v[-1:] == "]" and "\n" not in v for v in values])
+    matches = pd.DataFrame.from_records(_FRAMES_RE.findall("\n".join(values.iloc[candidates])),
+                                        columns=["file", "method", "line_number", "end"])
+    # the frames of a stack are followed by the newline that ends it
+    ends = (matches["end"] != "").to_numpy()
+    owners = candidates[np.cumsum(ends)[~ends]]
+    matches = matches[~ends]
+    frame_length = sum(matches[c].str.len().to_numpy() for c in ["file", "method", "line_number"]) + len(_FRAME_LAYOUT)
+    n_frames = np.bincount(owners, minlength=len(values))
+    length = np.bincount(owners, weights=frame_length, minlength=len(values)) + 2 * n_frames + 2 * (n_frames == 0)
+    regular = np.zeros(len(values), dtype=bool)
+    regular[candidates] = values.iloc[candidates].str.len().to_numpy() == length[candidates]
+
+    keep = regular[owners]
+    tokens = [[matches[c].to_numpy()[keep]] for c in ["file", "method", "line_number"]]
+    owners = [owners[keep]]
+    for i in np.flatnonzero(~regular):
+        frames = parse_stack(values[i])
+        for column, field in zip(tokens, zip(*frames)):
+            column.append(np.array([repr(v) for v in field], dtype=object))
+        owners.append(np.full(len(frames), i, dtype=np.int64))
+    owners = np.concatenate(owners)
+    order = np.argsort(owners, kind="stable")
+    file_tokens, method_tokens, line_tokens = (np.concatenate(column)[order] for column in tokens)
+
+    frame_file, files = _intern(file_tokens, _literal)
+    frame_method, methods = _intern(method_tokens, _literal)
+    frame_line, lines = _intern(line_tokens, lambda t: _line_number(_literal(t)))
+    stack_offsets = np.zeros(len(uniques) + 2, dtype=np.int64)
+    np.cumsum(np.bincount(owners, minlength=len(uniques) + 1), out=stack_offsets[1:])
+    return StackIndex(
+        files=files,
+        methods=methods,
+        frame_file=frame_file,
+        frame_method=frame_method,
+        frame_line=np.asarray(lines, dtype=np.int32)[frame_line],
+        stack_offsets=stack_offsets,
+        stack_ids=codes,
+    )
@@ -0,0 +1,52 @@
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from zipfile import ZipFile
+
+import pandas as pd
+
+import cache
+import helper
+
+
+CHUNKSIZE = 1_000_000
+COUNT_KEYS = ["app_id", "android_version", "device_brand"]
+
+
+def iter_chunks(path="data.zip", columns=None, chunksize=CHUNKSIZE):
+    """yield the failure data of an archive in chunks, reading the csv member without extracting it.
+
+    chunks get the column types of cache.SCHEMA, so that their count tables share keys with the cached path."""
+    with ZipFile(path, "r") as zf:
+        with zf.open(cache.get_csv_member(zf)) as f:
+            for chunk in pd.read_csv(f, usecols=columns, dtype=cache.CSV_DTYPES, chunksize=chunksize):
+                yield cache.apply_schema(chunk)
+
+
+def aggregate(path="data.zip", by=COUNT_KEYS, column="type", chunksize=CHUNKSIZE) -> pd.DataFrame:
+    """fold an archive into a count table chunk by chunk.
+
+    memory is bounded by the chunk size and the number of distinct (by..., column) combinations,
+    not by the number of failures."""
+    by = list(by)
+    counts = pd.DataFrame(columns=by + [column, "count_phys", "count_virt"])
+    for chunk in iter_chunks(path, columns=by + [column, "device_model"], chunksize=chunksize):
+        part = helper.get_count_table(chunk, by=by, column=column)
+        counts = part if counts.empty else helper.merge_count_tables([counts, part])
+    return counts
+
+
+def aggregate_files(paths, n_jobs=None, func=aggregate, **kwargs) -> pd.DataFrame:
+    """fold many archives (e.g. one export per farm per day) into one count table over a process pool.
+
+    func(path, **kwargs) maps each archive to a partial count table in a worker; the partial tables are
+    then summed. the per-type counts of get_freq_list are folded from the result, so one table serves both."""
+    # largest archives first, so that the last ones to finish are small
+    paths = sorted(paths, key=os.path.getsize, reverse=True)
+    n_jobs = min(n_jobs or os.cpu_count(), len(paths))
+    if n_jobs == 1:
+        tables = [func(path, **kwargs) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            tables = list(executor.map(functools.partial(func, **kwargs), paths))
+    return helper.merge_count_tables(tables)
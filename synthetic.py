@@ -0,0 +1,113 @@
+import argparse
+import io
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import numpy as np
+import pandas as pd
+
+
+CHUNKSIZE = 1_000_000
+START_TIME = 1640995200  # 2022-01-01, the start of the three-month study
+DURATION = 90 * 86400
+COLUMNS = ["type", "error", "reason", "stack_frame", "thread_name", "failure_time", "app_id", "app_version",
+           "device_brand", "device_model", "android_version"]
+
+# the shape of the study: brands and their devices (Table 2), test rounds per app and devices per android version
+BRANDS = ["samsung", "xiaomi", "huawei", "vivo", "oppo", "honor", "redmi", "meizu", "lg", "docomo", "motorola", "infinix", "realme", "tecno", "google", "lenovo", "sony", "oneplus", "smartisan", "vsmart", "asus", "zte", "alcatel", "blackshark", "nubia", "alldocube", "blackview"]
+BRAND_DEVICES = np.array([1863, 959, 901, 540, 291, 198, 193, 179, 119, 84, 82, 77, 66, 61, 54, 44, 39, 38, 29, 28, 17, 17, 14, 11, 6, 5, 3])
+TEST_ROUNDS = np.array([12, 12, 12, 12, 12, 5, 12, 5, 12, 9])
+VERSION_DEVICES = np.array([172, 243, 373, 692, 1077, 1568, 1438, 355])  # android 5 to 12
+MINOR_VERSIONS = {5: [0, 1], 6: [0, 1], 7: [0, 1], 8: [0, 1], 9: [0], 10: [0], 11: [0], 12: [0]}
+
+ERRORS = ["java.lang.NullPointerException", "java.lang.IllegalStateException", "java.lang.OutOfMemoryError",
+          "java.lang.ClassCastException", "java.lang.NoClassDefFoundError", "java.lang.IllegalArgumentException",
+          "java.lang.ArrayIndexOutOfBoundsException", "java.lang.SecurityException", "SIGSEGV", "SIGABRT"]
+REASONS = ["must not be null", "Attempt to invoke virtual method on a null object reference", "Failed to allocate",
+           "cannot be cast", "Failed resolution", "Parameter specified as non-null is null", "length=0; index=0",
+           "Permission Denial", "null pointer dereference", "abort message"]
+
+
+def get_type_table(n_types, fp_ratio=0.03, fn_ratio=0.03, zipf=1.1, seed=0) -> pd.DataFrame:
+    """return the attributes of every synthetic failure type: popularity, class, error, reason and stack."""
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, n_types + 1) ** zipf
+    # the most frequent types are common to both device farms, as in Table 3
+    cls = rng.choice(["tp", "fp", "fn"], n_types, p=[1 - fp_ratio - fn_ratio, fp_ratio, fn_ratio])
+    cls[:min(10, n_types)] = "tp"
+    error = rng.integers(0, len(ERRORS), n_types)
+    depth = rng.integers(1, 6, n_types)
+    stacks = [str([{'file': f'module{(t * 7 + i) % 97}.java', 'method': f'method{(t * 13 + i * 31) % 997}()', 'line_number': str((t + i) % 500)}
+                   for i in range(d)]) for t, d in enumerate(depth)]
+    return pd.DataFrame({
+        "type": np.arange(1, n_types + 1),
+        "weight": weights / weights.sum(),
+        "class": cls,
+        "error": np.array(ERRORS)[error],
+        "reason": np.array(REASONS)[error],
+        "stack_frame": stacks,
+    })
+
+
+def _models():
+    """return every device model name and the range of models of each brand."""
+    n_models = np.maximum(1, BRAND_DEVICES // 20)
+    offsets = np.concatenate([[0], np.cumsum(n_models)])
+    names = np.array([f"{brand}-model-{k}" for brand, n in zip(BRANDS, n_models) for k in range(1, n + 1)])
+    return names, offsets[:-1], n_models
+
+
+def generate_chunk(types, size, rng) -> pd.DataFrame:
+    """return size synthetic failures following the schema of data.csv."""
+    t = rng.choice(len(types), size, p=types["weight"].to_numpy())
+    cls = types["class"].to_numpy()[t]
+    virt = np.where(cls == "tp", rng.random(size) < 0.5, cls == "fp")
+
+    brand = rng.choice(len(BRANDS), size, p=BRAND_DEVICES / BRAND_DEVICES.sum())
+    names, offsets, n_models = _models()
+    model = names[offsets[brand] + (rng.random(size) * n_models[brand]).astype(np.int64)]
+
+    versions = np.array([major + minor / 10 for major, minors in MINOR_VERSIONS.items() for minor in minors])
+    version_weights = np.array([VERSION_DEVICES[major - 5] / len(minors) for major, minors in MINOR_VERSIONS.items() for _ in minors])
+    failure_time = START_TIME + rng.random(size) * DURATION
+    # apps are tested weekly, and a failure is attributed to the version under test that week
+    weeks = pd.date_range(pd.Timestamp(START_TIME, unit="s"), periods=DURATION // (7 * 86400) + 1, freq="7D").strftime("%Y-%m-%d")
+
+    return pd.DataFrame({
+        "type": types["type"].to_numpy()[t],
+        "error": types["error"].to_numpy()[t],
+        "reason": types["reason"].to_numpy()[t],
+        "stack_frame": types["stack_frame"].to_numpy()[t],
+        "thread_name": np.array(["main", "thread-1", "thread-2", "RenderThread"])[rng.integers(0, 4, size)],
+        "failure_time": failure_time.round(),
+        "app_id": rng.choice(np.arange(1, 11), size, p=TEST_ROUNDS / TEST_ROUNDS.sum()),
+        "app_version": np.asarray(weeks)[((failure_time - START_TIME) // (7 * 86400)).astype(np.int64)],
+        "device_brand": np.array(BRANDS)[brand],
+        "device_model": np.where(virt, "virt", model),
+        "android_version": rng.choice(versions, size, p=version_weights / version_weights.sum()),
+    }, columns=COLUMNS)
+
+
+def generate(path, rows, n_types=None, chunksize=CHUNKSIZE, seed=0) -> str:
+    """write rows synthetic failures to a zip archive holding data.csv, chunk by chunk."""
+    n_types = n_types or max(500, rows // 2000)
+    types = get_type_table(n_types, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    with ZipFile(path, "w", ZIP_DEFLATED) as zf:
+        with zf.open("data.csv", "w", force_zip64=True) as raw:
+            f = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+            for start in range(0, rows, chunksize):
+                chunk = generate_chunk(types, min(chunksize, rows - start), rng)
+                chunk.to_csv(f, header=start == 0, index=False)
+            f.flush()
+            f.detach()
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic failure dataset with the schema of data.zip.")
+    parser.add_argument("rows", type=float, help="number of failures, e.g. 1e6")
+    parser.add_argument("--out", default="synthetic.zip", help="output archive")
+    parser.add_argument("--types", type=int, default=None, help="number of failure types")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"Saved {generate(args.out, int(args.rows), n_types=args.types, seed=args.seed)}")
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+import helper
+
+
+# count table keys reported for the top failure types
+AFFECTED = {"app_id": "apps", "device_brand": "brands", "android_version": "versions"}
+
+
+def select_top_k(types, counts, k) -> np.ndarray:
+    """return the positions of the k largest counts in O(n), ties broken by type."""
+    types, counts = np.asarray(types), np.asarray(counts)
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    if k < len(counts):
+        candidates = np.argpartition(-counts, k - 1)[:k]
+        # keep every type tied with the k-th count, so that the tie-break below is by type
+        candidates = np.flatnonzero(counts >= counts[candidates].min())
+    else:
+        candidates = np.arange(len(counts))
+    order = np.lexsort((types[candidates], -counts[candidates]))
+    return candidates[order][:k]
+
+
+def _as_key_values(column, values) -> np.ndarray:
+    """return filter values in the type of a numeric key column, so that 5.1 matches a float32 android version."""
+    dtype = column.cat.categories.dtype if isinstance(column.dtype, pd.CategoricalDtype) else column.dtype
+    if pd.api.types.is_numeric_dtype(dtype):
+        return np.asarray(values, dtype=dtype)
+    return np.asarray(values, dtype=object)
+
+
+def _filter(counts, where):
+    mask = np.ones(len(counts), dtype=bool)
+    for key, value in (where or {}).items():
+        if callable(value):
+            mask &= np.asarray(value(counts[key]), dtype=bool)
+        else:
+            values = [value] if np.isscalar(value) else list(value)
+            mask &= counts[key].isin(_as_key_values(counts[key], values)).to_numpy()
+    return counts[mask]
+
+
+def _unique_lists(counts, column, key) -> pd.Series:
+    """return the sorted unique values of key for every failure type, split from one sorted array."""
+    pairs = pd.DataFrame({column: np.asarray(counts[column]), key: np.asarray(counts[key])})
+    pairs = pairs.dropna().drop_duplicates().sort_values([column, key])
+    if pairs.empty:
+        return pd.Series(dtype=object)
+    if pairs[key].dtype == np.float32:
+        # android versions are float32; list them as 5.1 rather than 5.099999904632568
+        pairs[key] = pairs[key].astype(np.float64).round(6)
+    types, values = pairs[column].to_numpy(), pairs[key].to_list()
+    starts = np.flatnonzero(np.r_[True, types[1:] != types[:-1]])
+    ends = np.r_[starts[1:], len(types)]
+    return pd.Series([values[s:e] for s, e in zip(starts, ends)], index=types[starts], dtype=object)
+
+
+def get_top_k(counts, k=10, cls=None, where=None, freq=None, total=None, column="type") -> pd.DataFrame:
+    """return the k most frequent failure types of a count table and the apps, brands and versions they affect.
+
+    cls restricts the ranking to tp, fp or fn types, where to the rows matching every
+    {key: value, list of values or predicate} filter. portion is each count over total, which
+    defaults to the count of all the ranked candidates."""
+    if cls is not None:
+        if freq is None:
+            freq = helper.get_freq_list_from_counts(counts, column=column)
+        counts = counts[(counts[column].map(helper.get_class_labels(freq, column)) == cls).to_numpy()]
+    counts = _filter(counts, where)
+
+    per_type = counts.groupby(column, observed=True)[["count_phys", "count_virt"]].sum()
+    per_type["count"] = per_type["count_phys"] + per_type["count_virt"]
+    per_type = per_type[per_type["count"] > 0]
+    top = per_type.iloc[select_top_k(per_type.index.to_numpy(), per_type["count"].to_numpy(), k)]
+    top = top[["count", "count_phys", "count_virt"]].copy()
+    top["portion"] = top["count"] / (per_type["count"].sum() if total is None else total)
+    if top.empty:
+        # nothing matched the class and filters
+        for name in AFFECTED.values():
+            top[name] = pd.Series(dtype=object)
+        top.index.name = column
+        return top.reset_index()
+
+    # the affected apps, brands and versions of all top types, in one grouped pass
+    affected = counts[counts[column].isin(top.index)]
+    for key in [key for key in AFFECTED if key in affected.columns]:
+        top[AFFECTED[key]] = _unique_lists(affected, column, key).reindex(top.index)
+    top.index.name = column
+    return top.reset_index()
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+import helper
+
+
+# window metrics, before precision and recall
+COUNTS = ["tp_phys", "tp_virt", "fp", "fn", "count_phys", "count_virt"]
+
+
+def to_datetime(times) -> pd.Series:
+    """convert failure_time to datetimes. raw csv values are unix timestamps in seconds."""
+    times = pd.Series(times)
+    if pd.api.types.is_numeric_dtype(times.dtype):
+        return pd.to_datetime(times, unit="s")
+    return pd.to_datetime(times)
+
+
+class TimeIndex:
+    """failure rows sorted by time, for range lookups in O(log n)."""
+
+    def __init__(self, times):
+        times = to_datetime(times).to_numpy(dtype="datetime64[ns]")
+        self.order = np.argsort(times, kind="stable")
+        self.times = times[self.order]  # missing times sort last
+
+    def _bounds(self, start=None, end=None):
+        lo = 0 if start is None else np.searchsorted(self.times, np.datetime64(pd.Timestamp(start), "ns"), "left")
+        hi = np.searchsorted(self.times, np.datetime64("NaT"), "left")
+        if end is not None:
+            hi = min(hi, np.searchsorted(self.times, np.datetime64(pd.Timestamp(end), "ns"), "left"))
+        return lo, max(lo, hi)
+
+    def rows(self, start=None, end=None) -> np.ndarray:
+        """return the rows with start <= failure_time < end, in time order."""
+        lo, hi = self._bounds(start, end)
+        return self.order[lo:hi]
+
+    def count(self, start=None, end=None) -> int:
+        """return the number of failures with start <= failure_time < end."""
+        lo, hi = self._bounds(start, end)
+        return hi - lo
+
+
+def get_window_metrics(df, freq="D", window=7, step=1, by=None, classes="window", devices=None,
+                       column="type", time_column="failure_time") -> pd.DataFrame:
+    """return precision, recall and failure counts over sliding windows of failure_time.
+
+    the data are bucketed by freq ("D", "W", ...) into one count table, and every window covers
+    `window` consecutive buckets, every `step` buckets. by accepts the same keys as
+    helper.get_precision_recall. with classes="window", failure types are labelled tp/fp/fn from
+    the failures of each window; with classes="global", from the whole frame as in plot.py.
+    devices (a number, or a mapping from the last key to a number) adds per-device frequencies."""
+    if classes not in ("window", "global"):
+        raise ValueError(f"unknown classes: {classes}")
+    periods = to_datetime(df[time_column]).dt.to_period(freq)
+    ordinals = periods.array.asi8
+    valid = ~periods.isna().to_numpy()
+    keys = helper.as_keys(df, by)
+    names = [k.name for k in keys]
+    if not valid.any():
+        # no failure time to bucket (empty frame, or missing times only), so no window
+        index = pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), pd.DatetimeIndex([])] + [[] for _ in names],
+                                          names=["start", "end"] + names)
+        metrics = pd.DataFrame({k: np.zeros(0, dtype=np.int64) for k in COUNTS}, index=index)
+        return _add_frequencies(helper.add_precision_recall(metrics), devices)
+
+    first = ordinals[valid].min()
+    bucket = pd.Series(np.where(valid, ordinals - first, -1), index=df.index, name="bucket")
+    counts = helper.get_count_table(df, by=[bucket] + keys, column=column)
+    counts = counts[counts["bucket"] >= 0]
+
+    b = counts["bucket"].to_numpy(dtype=np.int64)
+    t, types = pd.factorize(counts[column])
+    if names:
+        g = counts.groupby(names, observed=True, sort=True).ngroup().to_numpy()
+        groups = counts.groupby(names, observed=True, sort=True).size().index
+    else:
+        g = np.zeros(len(counts), dtype=np.int64)
+        groups = None
+    p = counts["count_phys"].to_numpy(dtype=np.int64)
+    v = counts["count_virt"].to_numpy(dtype=np.int64)
+    n_buckets, n_types, n_groups = b.max() + 1, len(types), 1 if groups is None else len(groups)
+
+    # per-bucket type counts and their prefix sums, so that every window is one subtraction
+    has_type = t >= 0
+    cell = b[has_type] * n_types + t[has_type]
+    type_phys = np.bincount(cell, weights=p[has_type], minlength=n_buckets * n_types).reshape(n_buckets, n_types)
+    type_virt = np.bincount(cell, weights=v[has_type], minlength=n_buckets * n_types).reshape(n_buckets, n_types)
+
+    ends = np.arange(window - 1, n_buckets, step)
+    if classes == "window":
+        cum_phys = np.vstack([np.zeros(n_types), np.cumsum(type_phys, axis=0)])
+        cum_virt = np.vstack([np.zeros(n_types), np.cumsum(type_virt, axis=0)])
+        labels = helper.get_class_codes(cum_phys[ends + 1] - cum_phys[ends + 1 - window] > 0,
+                                        cum_virt[ends + 1] - cum_virt[ends + 1 - window] > 0)
+    else:
+        labels = helper.get_class_codes(type_phys.sum(0) > 0, type_virt.sum(0) > 0)
+        labels = np.broadcast_to(labels, (len(ends), n_types))
+
+    # every count table row contributes to the windows that cover its bucket
+    position = np.full(n_buckets, -1)
+    position[ends] = np.arange(len(ends))
+    size = len(ends) * n_groups
+    out = {k: np.zeros(size) for k in COUNTS}
+    keep = has_type & (g >= 0)
+    b, t, g, p, v = b[keep], t[keep], g[keep], p[keep], v[keep]
+    for k in range(window):
+        e = b + k
+        e = np.where(e < n_buckets, position[np.minimum(e, n_buckets - 1)], -1)
+        inside = e >= 0
+        cell, label = e[inside] * n_groups + g[inside], labels[e[inside], t[inside]]
+        phys, virt = p[inside], v[inside]
+        out["count_phys"] += np.bincount(cell, weights=phys, minlength=size)
+        out["count_virt"] += np.bincount(cell, weights=virt, minlength=size)
+        for name, mask, weights in [("tp_phys", label == 0, phys), ("tp_virt", label == 0, virt),
+                                    ("fp", label == 1, phys + virt), ("fn", label == 2, phys + virt)]:
+            out[name] += np.bincount(cell[mask], weights=weights[mask], minlength=size)
+
+    buckets = pd.period_range(pd.Period(ordinal=first, freq=periods.dt.freq), periods=n_buckets)
+    index = {
+        "start": np.repeat(buckets[ends + 1 - window].start_time, n_groups),
+        "end": np.repeat((buckets[ends] + 1).start_time, n_groups),
+    }
+    if groups is not None:
+        for i, name in enumerate(names):
+            level = groups.get_level_values(i) if isinstance(groups, pd.MultiIndex) else groups
+            index[name] = np.tile(level.to_numpy(), len(ends))
+    metrics = pd.DataFrame({k: v.astype(np.int64) for k, v in out.items()})
+    metrics.index = pd.MultiIndex.from_arrays(list(index.values()), names=list(index))
+    metrics = metrics[(metrics["count_phys"] + metrics["count_virt"]) > 0]
+    return _add_frequencies(helper.add_precision_recall(metrics), devices)
+
+
+def _add_frequencies(metrics, devices) -> pd.DataFrame:
+    """add the per-device frequencies of the window counts, if the number of devices is given."""
+    if devices is not None:
+        if np.isscalar(devices):
+            n_devices = devices
+        else:
+            n_devices = metrics.index.get_level_values(-1).map(pd.Series(devices)).to_numpy(dtype=float)
+        metrics["freq_phys"] = metrics["count_phys"] / n_devices
+        metrics["freq_virt"] = metrics["count_virt"] / n_devices
+    return metrics